@@ -15,18 +15,53 @@ Asset Types:
 """
 
 import argparse
+import functools
+import hashlib
 import json
 import os
+import shutil
 import sys
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    # Pillow is imported where it's used; this is only for the annotations
+    from PIL import Image
 
 # Add scripts directory to path for imports
 SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
 from config import load_config, get_api_key, get_output_dir
-from utils import print_result, validate_api_key, get_image_mime_type
+from providers.base import get_cache_dir, prune_cache
+from utils import (print_result, validate_api_key, get_image_mime_type,
+                   save_base64_image, print_json, emit_error)
+
+# Provider SDKs are optional: each is only required for its own provider
+try:
+    from google import genai
+    from google.genai import types
+except ImportError:
+    genai = None
+    types = None
+
+try:
+    from openai import OpenAI
+except ImportError:
+    OpenAI = None
+
+
+@functools.lru_cache(maxsize=None)
+def _google_client(api_key: str):
+    """Return a process-wide Google GenAI client for the given key."""
+    return genai.Client(api_key=api_key)
+
+
+@functools.lru_cache(maxsize=None)
+def _openai_client(api_key: str):
+    """Return a process-wide OpenAI client for the given key."""
+    return OpenAI(api_key=api_key)
+
 
 # Asset type definitions
 ASSET_TYPES = {
@@ -65,16 +100,90 @@ ASSET_TYPES = {
 }
 
 
+# Square sizes supported by dall-e-2, smallest first
+DALLE2_SQUARE_SIZES = [256, 512, 1024]
+
+
+def _openai_size(model: str, aspect_ratio: str, target_size: int = None) -> str:
+    """Pick the cheapest OpenAI size that still covers the largest output.
+
+    Only dall-e-2 offers squares below 1024; other models fall back to the
+    aspect ratio mapping.
+    """
+    if aspect_ratio == "1:1" and target_size and model.startswith("dall-e-2"):
+        for size in DALLE2_SQUARE_SIZES:
+            if size >= target_size:
+                return f"{size}x{size}"
+
+    # Map aspect ratio to OpenAI size
+    size_map = {
+        "1:1": "1024x1024",
+        "16:9": "1536x1024",
+        "9:16": "1024x1536"
+    }
+    return size_map.get(aspect_ratio, "1024x1024")
+
+
+def _base_image_cache_path(prompt: str, provider: str, model: str, aspect_ratio: str,
+                           size: str = None) -> Path:
+    """Get the cache location for a base image generated with these settings.
+
+    Base images share the provider image cache (sharded by key prefix), so
+    prune_cache() bounds them by age and total size along with the rest.
+    """
+    key = hashlib.sha256(json.dumps({
+        "prompt": prompt,
+        "provider": provider,
+        "model": model,
+        "aspect": aspect_ratio,
+        "size": size
+    }, sort_keys=True).encode()).hexdigest()
+    return get_cache_dir() / key[:2] / f"{key}.png"
+
+
 def generate_base_image(prompt: str, provider: str, model: str,
-                        aspect_ratio: str, output_path: Path) -> dict:
-    """Generate a base image at high resolution."""
-    if provider == "google":
+                        aspect_ratio: str, output_path: Path,
+                        use_cache: bool = True, target_size: int = None) -> dict:
+    """Generate a base image at high resolution.
+
+    Base images are cached on disk keyed by prompt, provider, model, aspect
+    ratio and request size, so re-running with the same settings skips the
+    API call. ``target_size`` is the largest edge that will be derived from
+    the base image and lets OpenAI requests use a smaller, cheaper size.
+    """
+    size = _openai_size(model, aspect_ratio, target_size) if provider == "openai" else None
+    cache_path = _base_image_cache_path(prompt, provider, model, aspect_ratio, size) if use_cache else None
+    if cache_path and cache_path.exists():
+        shutil.copyfile(cache_path, output_path)
+        # Refresh the mtime so prune_cache() evicts by last use
+        os.utime(cache_path)
+        return {"success": True, "file": str(output_path), "cached": True}
+
+    result = _request_base_image(prompt, provider, model, aspect_ratio, output_path, size)
+
+    if cache_path and result["success"]:
         try:
-            from google import genai
-            from google.genai import types
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Copy then rename, so a concurrent run never reads a partial file
+            tmp = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+            shutil.copyfile(output_path, tmp)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            print(f"Warning: Could not cache base image: {e}", file=sys.stderr)
+
+    return result
 
-            api_key = get_api_key("google")
-            client = genai.Client(api_key=api_key)
+
+def _request_base_image(prompt: str, provider: str, model: str,
+                        aspect_ratio: str, output_path: Path,
+                        size: str = None) -> dict:
+    """Request a base image from the provider API."""
+    if provider == "google":
+        if genai is None:
+            return {"success": False,
+                    "error": "google-genai package not installed. Run: pip install google-genai"}
+        try:
+            client = _google_client(get_api_key("google"))
 
             config = types.GenerateContentConfig(
                 response_modalities=["IMAGE"],
@@ -90,8 +199,7 @@ def generate_base_image(prompt: str, provider: str, model: str,
 
             for part in response.parts:
                 if hasattr(part, "inline_data") and part.inline_data:
-                    with open(output_path, "wb") as f:
-                        f.write(part.inline_data.data)
+                    output_path.write_bytes(part.inline_data.data)
                     return {"success": True, "file": str(output_path)}
 
             return {"success": False, "error": "No image returned"}
@@ -100,28 +208,25 @@ def generate_base_image(prompt: str, provider: str, model: str,
             return {"success": False, "error": str(e)}
 
     else:  # openai
+        if OpenAI is None:
+            return {"success": False,
+                    "error": "openai package not installed. Run: pip install openai"}
         try:
-            from openai import OpenAI
-            from utils import save_base64_image
-
-            api_key = get_api_key("openai")
-            client = OpenAI(api_key=api_key)
+            client = _openai_client(get_api_key("openai"))
 
-            # Map aspect ratio to OpenAI size
-            size_map = {
-                "1:1": "1024x1024",
-                "16:9": "1536x1024",
-                "9:16": "1024x1536"
+            params = {
+                "model": model,
+                "prompt": prompt,
+                "n": 1,
+                "size": size or _openai_size(model, aspect_ratio),
             }
-            size = size_map.get(aspect_ratio, "1024x1024")
+            if model.startswith("dall-e-2"):
+                # dall-e-2 only has standard quality and returns URLs by default
+                params["response_format"] = "b64_json"
+            else:
+                params["quality"] = "high"
 
-            response = client.images.generate(
-                model=model,
-                prompt=prompt,
-                n=1,
-                size=size,
-                quality="high"
-            )
+            response = client.images.generate(**params)
 
             if response.data:
                 image_data = response.data[0]
@@ -135,41 +240,127 @@ def generate_base_image(prompt: str, provider: str, model: str,
             return {"success": False, "error": str(e)}
 
 
-def resize_image(input_path: Path, output_path: Path, width: int, height: int = None) -> bool:
-    """Resize image using PIL."""
+def _lanczos_resize(img: "Image.Image", width: int, height: int,
+                    crop: bool = False) -> "Image.Image":
+    """Lanczos resize, with a cheap BOX reduction first for large downscales.
+
+    reducing_gap=2.0 is what Image.thumbnail uses internally: the BOX pass
+    shrinks by whole factors so the Lanczos kernel runs on far fewer pixels.
+    With ``crop`` the source is center-cropped to the target aspect ratio
+    first (like ImageOps.fit) instead of being stretched.
+    """
+    from PIL import Image
+
+    box = None
+    if crop:
+        src_w, src_h = img.size
+        if src_w * height > src_h * width:
+            crop_w = src_h * width / height
+            box = ((src_w - crop_w) / 2, 0, (src_w + crop_w) / 2, src_h)
+        else:
+            crop_h = src_w * height / width
+            box = (0, (src_h - crop_h) / 2, src_w, (src_h + crop_h) / 2)
+        src_w, src_h = box[2] - box[0], box[3] - box[1]
+    else:
+        src_w, src_h = img.size
+
+    reducing_gap = 2.0 if width * 2 <= src_w and height * 2 <= src_h else None
+    return img.resize((width, height), Image.Resampling.LANCZOS, box=box,
+                      reducing_gap=reducing_gap)
+
+
+def resize_image(src: Union[Path, "Image.Image"], output_path: Path,
+                 width: int, height: int = None,
+                 compress_level: int = 1, crop: bool = False) -> Optional["Image.Image"]:
+    """Resize image using PIL.
+
+    Args:
+        src: Source image path, or an already-decoded PIL image so callers
+            producing several sizes only decode the source once.
+        output_path: Target path.
+        width: Target width.
+        height: Target height (defaults to width for square output).
+        compress_level: zlib level for PNG output (0-9). Defaults to a fast
+            level; use 9 for smallest files when shipping to production.
+        crop: Center-crop to the target aspect ratio instead of stretching.
+
+    Returns:
+        The resized image if it was saved, otherwise None.
+    """
     try:
         from PIL import Image
 
-        with Image.open(input_path) as img:
-            if height is None:
-                height = width  # Square
+        if height is None:
+            height = width  # Square
 
-            # Use high-quality resampling
-            resized = img.resize((width, height), Image.Resampling.LANCZOS)
+        # Use high-quality resampling
+        if isinstance(src, Image.Image):
+            resized = _lanczos_resize(src, width, height, crop)
+        else:
+            with Image.open(src) as img:
+                resized = _lanczos_resize(img, width, height, crop)
+
+        if output_path.suffix.lower() == ".png":
+            # PNG ignores quality; the zlib level is what costs encode time
+            resized.save(output_path, format="PNG", compress_level=compress_level, optimize=False)
+        else:
             resized.save(output_path, quality=95)
-            return True
+        return resized
 
     except ImportError:
         print("Warning: PIL not available for resizing. Install: pip install Pillow")
-        return False
+        return None
     except Exception as e:
         print(f"Resize error: {e}")
-        return False
+        return None
+
 
+def resize_image_batch(input_path: Path, targets: List[Tuple[Path, int, int]],
+                       compress_level: int = 1, crop: bool = False) -> Dict[Path, "Image.Image"]:
+    """Resize one source image to several sizes, decoding it only once.
 
-def create_ico(png_files: List[Path], output_path: Path) -> bool:
-    """Create .ico file from PNG files."""
+    Args:
+        input_path: Source image path.
+        targets: (output_path, width, height) tuples to produce.
+        compress_level: zlib level for PNG output (0-9).
+        crop: Center-crop to each target's aspect ratio instead of stretching.
+
+    Returns:
+        Mapping of successfully written output paths to their resized images.
+    """
     try:
         from PIL import Image
+    except ImportError:
+        print("Warning: PIL not available for resizing. Install: pip install Pillow")
+        return {}
 
-        images = []
-        for png_file in png_files:
-            if png_file.exists():
-                with Image.open(png_file) as img:
-                    images.append(img.copy())
+    written = {}
+    try:
+        with Image.open(input_path) as src:
+            src.load()
+            for output_path, width, height in targets:
+                resized = resize_image(src, output_path, width, height, compress_level, crop)
+                if resized is not None:
+                    written[output_path] = resized
+    except Exception as e:
+        print(f"Resize error: {e}")
 
+    return written
+
+
+def create_ico(images: List["Image.Image"], output_path: Path) -> bool:
+    """Create .ico file from already-resized images (one frame per image)."""
+    try:
         if images:
-            images[0].save(output_path, format="ICO", sizes=[(16, 16), (32, 32), (48, 48)])
+            # ICO frames larger than the primary image are dropped, so save
+            # from the largest and embed the others as-is
+            ordered = sorted(images, key=lambda img: img.size, reverse=True)
+            ordered[0].save(
+                output_path,
+                format="ICO",
+                sizes=[img.size for img in ordered],
+                append_images=ordered[1:]
+            )
             return True
         return False
 
@@ -178,7 +369,8 @@ def create_ico(png_files: List[Path], output_path: Path) -> bool:
         return False
 
 
-def generate_icons(prompt: str, provider: str, model: str, output_dir: Path) -> dict:
+def generate_icons(prompt: str, provider: str, model: str, output_dir: Path,
+                   use_cache: bool = True, compress_level: int = 1) -> dict:
     """Generate app icons at multiple sizes."""
     asset_config = ASSET_TYPES["icons"]
     results = {"type": "icons", "files": [], "errors": []}
@@ -190,7 +382,9 @@ def generate_icons(prompt: str, provider: str, model: str, output_dir: Path) ->
         provider=provider,
         model=model,
         aspect_ratio="1:1",
-        output_path=base_path
+        output_path=base_path,
+        use_cache=use_cache,
+        target_size=max(asset_config["sizes"])
     )
 
     if not base_result["success"]:
@@ -198,19 +392,21 @@ def generate_icons(prompt: str, provider: str, model: str, output_dir: Path) ->
 
     results["files"].append(str(base_path))
 
-    # Resize to all sizes
-    for size in asset_config["sizes"]:
-        output_path = output_dir / f"icon_{size}.png"
-        if resize_image(base_path, output_path, size, size):
+    # Resize to all sizes from a single decode of the base image
+    targets = [(output_dir / f"icon_{size}.png", size, size) for size in asset_config["sizes"]]
+    written = resize_image_batch(base_path, targets, compress_level)
+    for output_path, width, height in targets:
+        if output_path in written:
             results["files"].append(str(output_path))
         else:
-            results["errors"].append(f"Failed to resize to {size}x{size}")
+            results["errors"].append(f"Failed to resize to {width}x{height}")
 
     results["success"] = len(results["files"]) > 1
     return results
 
 
-def generate_favicons(prompt: str, provider: str, model: str, output_dir: Path) -> dict:
+def generate_favicons(prompt: str, provider: str, model: str, output_dir: Path,
+                      use_cache: bool = True, compress_level: int = 1) -> dict:
     """Generate web favicons."""
     asset_config = ASSET_TYPES["favicons"]
     results = {"type": "favicons", "files": [], "errors": []}
@@ -222,7 +418,9 @@ def generate_favicons(prompt: str, provider: str, model: str, output_dir: Path)
         provider=provider,
         model=model,
         aspect_ratio="1:1",
-        output_path=base_path
+        output_path=base_path,
+        use_cache=use_cache,
+        target_size=max(asset_config["sizes"])
     )
 
     if not base_result["success"]:
@@ -230,22 +428,22 @@ def generate_favicons(prompt: str, provider: str, model: str, output_dir: Path)
 
     results["files"].append(str(base_path))
 
-    # Resize to all sizes
-    png_files = []
-    for size in asset_config["sizes"]:
-        output_path = output_dir / f"favicon-{size}x{size}.png"
-        if resize_image(base_path, output_path, size, size):
-            results["files"].append(str(output_path))
-            png_files.append(output_path)
+    # Resize to all sizes (plus apple-touch-icon) from a single decode
+    targets = [(output_dir / f"favicon-{size}x{size}.png", size, size)
+               for size in asset_config["sizes"]]
+    apple_path = output_dir / "apple-touch-icon.png"
+    written = resize_image_batch(base_path, targets + [(apple_path, 180, 180)], compress_level)
 
-    # Create favicon.ico
+    png_files = [path for path, _, _ in targets if path in written]
+    results["files"].extend(str(path) for path in png_files)
+
+    # Create favicon.ico from the in-memory 16, 32 and 48 images
     ico_path = output_dir / "favicon.ico"
-    if create_ico(png_files[:3], ico_path):  # Use 16, 32, 48
+    if create_ico([written[path] for path in png_files[:3]], ico_path):
         results["files"].append(str(ico_path))
 
     # Create apple-touch-icon
-    apple_path = output_dir / "apple-touch-icon.png"
-    if resize_image(base_path, apple_path, 180, 180):
+    if apple_path in written:
         results["files"].append(str(apple_path))
 
     results["success"] = len(results["files"]) > 1
@@ -253,7 +451,7 @@ def generate_favicons(prompt: str, provider: str, model: str, output_dir: Path)
 
 
 def generate_social(prompt: str, provider: str, model: str, output_dir: Path,
-                    variants: List[str] = None) -> dict:
+                    variants: List[str] = None, use_cache: bool = True) -> dict:
     """Generate social media images."""
     asset_config = ASSET_TYPES["social"]
     results = {"type": "social", "files": [], "errors": []}
@@ -261,11 +459,22 @@ def generate_social(prompt: str, provider: str, model: str, output_dir: Path,
     if variants is None:
         variants = list(asset_config["variants"].keys())
 
+    # Group variants by aspect ratio so near-identical sizes share one image
+    groups: Dict[str, List[str]] = {}
     for variant_name in variants:
         if variant_name not in asset_config["variants"]:
             results["errors"].append(f"Unknown variant: {variant_name}")
             continue
+        aspect = asset_config["variants"][variant_name]["aspect"]
+        groups.setdefault(aspect, []).append(variant_name)
 
+    for aspect, names in groups.items():
+        if len(names) > 1:
+            _generate_social_group(prompt, provider, model, output_dir, aspect,
+                                   names, use_cache, results)
+            continue
+
+        variant_name = names[0]
         variant = asset_config["variants"][variant_name]
         output_path = output_dir / variant["name"]
 
@@ -275,7 +484,8 @@ def generate_social(prompt: str, provider: str, model: str, output_dir: Path,
             provider=provider,
             model=model,
             aspect_ratio=variant["aspect"],
-            output_path=output_path
+            output_path=output_path,
+            use_cache=use_cache
         )
 
         if result["success"]:
@@ -287,8 +497,43 @@ def generate_social(prompt: str, provider: str, model: str, output_dir: Path,
     return results
 
 
+def _generate_social_group(prompt: str, provider: str, model: str, output_dir: Path,
+                           aspect: str, names: List[str], use_cache: bool,
+                           results: dict) -> None:
+    """Generate one base image for variants sharing an aspect ratio, then crop each."""
+    asset_variants = ASSET_TYPES["social"]["variants"]
+    width = max(asset_variants[name]["width"] for name in names)
+    height = max(asset_variants[name]["height"] for name in names)
+
+    base_path = output_dir / f"social_base_{aspect.replace(':', 'x')}.png"
+    result = generate_base_image(
+        prompt=f"{prompt}. Optimized for {', '.join(names)} ({width}x{height}).",
+        provider=provider,
+        model=model,
+        aspect_ratio=aspect,
+        output_path=base_path,
+        use_cache=use_cache
+    )
+
+    if not result["success"]:
+        results["errors"].extend(f"{name}: {result['error']}" for name in names)
+        return
+
+    results["files"].append(str(base_path))
+
+    targets = [(output_dir / asset_variants[name]["name"],
+                asset_variants[name]["width"], asset_variants[name]["height"])
+               for name in names]
+    written = resize_image_batch(base_path, targets, crop=True)
+    for name, (output_path, w, h) in zip(names, targets):
+        if output_path in written:
+            results["files"].append(str(output_path))
+        else:
+            results["errors"].append(f"{name}: Failed to resize to {w}x{h}")
+
+
 def generate_thumbnails(prompt: str, provider: str, model: str, output_dir: Path,
-                        variants: List[str] = None) -> dict:
+                        variants: List[str] = None, use_cache: bool = True) -> dict:
     """Generate content thumbnails."""
     asset_config = ASSET_TYPES["thumbnails"]
     results = {"type": "thumbnails", "files": [], "errors": []}
@@ -309,7 +554,8 @@ def generate_thumbnails(prompt: str, provider: str, model: str, output_dir: Path
             provider=provider,
             model=model,
             aspect_ratio=variant["aspect"],
-            output_path=output_path
+            output_path=output_path,
+            use_cache=use_cache
         )
 
         if result["success"]:
@@ -335,6 +581,11 @@ def main():
                         help="Specific variants (for social/thumbnails)")
     parser.add_argument("--list-variants", action="store_true",
                         help="List available variants for asset type")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the provider instead of reusing cached base images")
+    parser.add_argument("--compress-level", type=int, choices=range(10), default=1,
+                        metavar="0-9",
+                        help="PNG compression level for resized icons (default: 1, fast; 9 = smallest)")
     parser.add_argument("--json", action="store_true", help="Output as JSON")
 
     args = parser.parse_args()
@@ -360,11 +611,7 @@ def main():
     # Validate API key
     valid, msg = validate_api_key(provider)
     if not valid:
-        if args.json:
-            print(json.dumps({"success": False, "error": msg}))
-        else:
-            print_result(False, msg)
-        sys.exit(1)
+        emit_error(msg, args.json)
 
     # Get model
     provider_config = config.get(provider, {})
@@ -386,18 +633,23 @@ def main():
         print()
 
     # Generate based on type
+    use_cache = not args.no_cache
     if args.type == "icons":
-        result = generate_icons(args.prompt, provider, model, output_dir)
+        result = generate_icons(args.prompt, provider, model, output_dir, use_cache,
+                                compress_level=args.compress_level)
     elif args.type == "favicons":
-        result = generate_favicons(args.prompt, provider, model, output_dir)
+        result = generate_favicons(args.prompt, provider, model, output_dir, use_cache,
+                                   compress_level=args.compress_level)
     elif args.type == "social":
-        result = generate_social(args.prompt, provider, model, output_dir, args.variants)
+        result = generate_social(args.prompt, provider, model, output_dir, args.variants, use_cache)
     elif args.type == "thumbnails":
-        result = generate_thumbnails(args.prompt, provider, model, output_dir, args.variants)
+        result = generate_thumbnails(args.prompt, provider, model, output_dir, args.variants, use_cache)
+    if use_cache:
+        prune_cache()
 
     # Output results
     if args.json:
-        print(json.dumps(result, indent=2))
+        print_json(result)
     else:
         if result["success"]:
             print_result(
@@ -17,19 +17,89 @@ Options:
 """
 
 import argparse
-import json
+import asyncio
 import os
 import sys
 from datetime import datetime
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add scripts directory to path for imports
 SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
 from config import load_config, get_api_key, get_output_dir
-from utils import print_result, validate_api_key, get_image_mime_type
+from moodboard import TokenBucket
+from utils import (print_result, validate_api_key, get_image_mime_type,
+                   save_base64_image, write_image, json_dumps, print_json,
+                   emit_error)
+
+# Provider SDKs are optional: each is only required for its own provider
+try:
+    from google import genai
+    from google.genai import types
+except ImportError:
+    genai = None
+    types = None
+
+try:
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+
+
+def _get_client(provider: str, api_key: str):
+    """Return a new async client for a provider, or None if its SDK is missing.
+
+    Async clients hold connections bound to the event loop they were first
+    used on, so one is created per asyncio.run() rather than cached.
+    """
+    if provider == "google":
+        return genai.Client(api_key=api_key) if genai is not None else None
+    return AsyncOpenAI(api_key=api_key) if AsyncOpenAI is not None else None
+
+
+async def _close_client(provider: str, client) -> None:
+    """Release the async client's connections before its event loop closes."""
+    if client is None:
+        return
+    if provider == "google":
+        aclose = getattr(client.aio, "aclose", None)
+    else:
+        aclose = getattr(client, "close", None)
+    if aclose is not None:
+        await aclose()
+
+
+def _load_reference(reference_path: Path, provider: str):
+    """Read a reference image into the form the provider's API takes.
+
+    Returns a ``types.Part`` for Google or an upload tuple for OpenAI, or
+    None when there is no reference image.
+    """
+    if not reference_path or not reference_path.exists():
+        return None
+    if provider == "google" and types is None:
+        # generate_with_reference() reports the missing SDK
+        return None
+    with open(reference_path, "rb") as f:
+        image_data = f.read()
+    mime_type = get_image_mime_type(reference_path)
+    if provider == "google":
+        return types.Part(inline_data=types.Blob(mime_type=mime_type, data=image_data))
+    return (reference_path.name, image_data, mime_type)
+
+
+async def _preload_reference(reference_path: Path, provider: str):
+    """Load a reference once for every pose to share.
+
+    Returns None if it can't be read; each pose then loads it itself and
+    reports the error in its own result.
+    """
+    try:
+        return await asyncio.to_thread(_load_reference, reference_path, provider)
+    except OSError:
+        return None
+
 
 # Predefined pose sets
 POSE_PRESETS = {
@@ -40,6 +110,9 @@ POSE_PRESETS = {
     "headshots": ["front face", "three-quarter face", "profile face", "looking up", "looking down"]
 }
 
+# Characters replaced when turning a description into a directory name
+_SLUG_TABLE = str.maketrans({" ": "_", "/": "_", "\\": "_"})
+
 # Art style modifiers
 STYLE_MODIFIERS = {
     "anime": "anime style, cel shaded, vibrant colors",
@@ -55,17 +128,25 @@ STYLE_MODIFIERS = {
 }
 
 
-def generate_with_reference(description: str, pose: str, reference_path: Path,
-                            style: str, provider: str, model: str,
-                            output_path: Path) -> dict:
-    """Generate character image with reference for consistency."""
+async def generate_with_reference(description: str, pose: str, reference_path: Path,
+                                  style: str, provider: str, model: str,
+                                  output_path: Path, api_key: str = None,
+                                  client=None, reference=None) -> dict:
+    """Generate character image with reference for consistency.
+
+    Callers generating many poses should resolve ``api_key`` and ``client``
+    once and pass them in, along with ``reference`` from _load_reference()
+    so the image is read once rather than per pose.
+    """
     if provider == "google":
+        if genai is None:
+            return {"success": False,
+                    "error": "google-genai package not installed. Run: pip install google-genai",
+                    "pose": pose}
         try:
-            from google import genai
-            from google.genai import types
-
-            api_key = get_api_key("google")
-            client = genai.Client(api_key=api_key)
+            client = client or _get_client("google", api_key or get_api_key("google"))
+            if reference is None and reference_path:
+                reference = await asyncio.to_thread(_load_reference, reference_path, provider)
 
             # Build prompt
             style_mod = STYLE_MODIFIERS.get(style, style) if style else ""
@@ -78,27 +159,13 @@ def generate_with_reference(description: str, pose: str, reference_path: Path,
                 prompt_parts.append(f"Style: {style_mod}")
             prompt = ". ".join(prompt_parts)
 
-            # Load reference image
-            contents = []
-            if reference_path and reference_path.exists():
-                with open(reference_path, "rb") as f:
-                    image_data = f.read()
-                mime_type = get_image_mime_type(reference_path)
-
-                contents.append(types.Part(
-                    inline_data=types.Blob(
-                        mime_type=mime_type,
-                        data=image_data
-                    )
-                ))
-
-            contents.append(prompt)
+            contents = [reference, prompt] if reference is not None else [prompt]
 
             config = types.GenerateContentConfig(
                 response_modalities=["IMAGE"],
             )
 
-            response = client.models.generate_content(
+            response = await client.aio.models.generate_content(
                 model=model,
                 contents=contents,
                 config=config
@@ -106,8 +173,7 @@ def generate_with_reference(description: str, pose: str, reference_path: Path,
 
             for part in response.parts:
                 if hasattr(part, "inline_data") and part.inline_data:
-                    with open(output_path, "wb") as f:
-                        f.write(part.inline_data.data)
+                    await asyncio.to_thread(write_image, part.inline_data.data, output_path)
                     return {
                         "success": True,
                         "file": str(output_path),
@@ -120,12 +186,14 @@ def generate_with_reference(description: str, pose: str, reference_path: Path,
             return {"success": False, "error": str(e), "pose": pose}
 
     else:  # OpenAI - less ideal for character consistency but still works
+        if AsyncOpenAI is None:
+            return {"success": False,
+                    "error": "openai package not installed. Run: pip install openai",
+                    "pose": pose}
         try:
-            from openai import OpenAI
-            from utils import save_base64_image
-
-            api_key = get_api_key("openai")
-            client = OpenAI(api_key=api_key)
+            client = client or _get_client("openai", api_key or get_api_key("openai"))
+            if reference is None and reference_path:
+                reference = await asyncio.to_thread(_load_reference, reference_path, provider)
 
             style_mod = STYLE_MODIFIERS.get(style, style) if style else ""
             prompt_parts = [f"Character design: {description}", f"Pose: {pose}"]
@@ -133,17 +201,16 @@ def generate_with_reference(description: str, pose: str, reference_path: Path,
                 prompt_parts.append(style_mod)
 
             # If we have a reference, use edit endpoint
-            if reference_path and reference_path.exists():
-                with open(reference_path, "rb") as ref_file:
-                    response = client.images.edit(
-                        model=model,
-                        image=ref_file,
-                        prompt=". ".join(prompt_parts),
-                        n=1,
-                        size="1024x1024"
-                    )
+            if reference is not None:
+                response = await client.images.edit(
+                    model=model,
+                    image=reference,
+                    prompt=". ".join(prompt_parts),
+                    n=1,
+                    size="1024x1024"
+                )
             else:
-                response = client.images.generate(
+                response = await client.images.generate(
                     model=model,
                     prompt=". ".join(prompt_parts),
                     n=1,
@@ -154,7 +221,7 @@ def generate_with_reference(description: str, pose: str, reference_path: Path,
             if response.data:
                 image_data = response.data[0]
                 if hasattr(image_data, "b64_json") and image_data.b64_json:
-                    save_base64_image(image_data.b64_json, output_path)
+                    await asyncio.to_thread(save_base64_image, image_data.b64_json, output_path)
                     return {"success": True, "file": str(output_path), "pose": pose}
 
             return {"success": False, "error": "No image returned", "pose": pose}
@@ -165,9 +232,42 @@ def generate_with_reference(description: str, pose: str, reference_path: Path,
 
 def generate_character_sheet(description: str, poses: list, style: str,
                              provider: str, model: str, output_dir: Path,
-                             reference_path: Path = None, parallel: int = 2,
-                             quiet: bool = False) -> dict:
-    """Generate complete character sheet with multiple poses."""
+                             reference_path: Path = None, parallel: int = 8,
+                             quiet: bool = False, rpm: float = 0) -> dict:
+    """Generate complete character sheet with multiple poses.
+
+    All requests share one event loop; ``parallel`` caps how many are in
+    flight at once and ``rpm`` how many start per minute (0 = unlimited).
+    """
+    return asyncio.run(_generate_character_sheet(
+        description, poses, style, provider, model, output_dir,
+        reference_path, parallel, quiet, rpm
+    ))
+
+
+async def _generate_character_sheet(description: str, poses: list, style: str,
+                                    provider: str, model: str, output_dir: Path,
+                                    reference_path: Path, parallel: int,
+                                    quiet: bool, rpm: float) -> dict:
+    """Async implementation of generate_character_sheet()."""
+    # Resolve credentials and the client once for every pose; the client is
+    # closed before asyncio.run() tears down the loop its connections use
+    api_key = get_api_key(provider)
+    client = _get_client(provider, api_key)
+    bucket = TokenBucket(rpm, capacity=min(parallel, rpm)) if rpm > 0 else None
+    try:
+        return await _generate_poses(description, poses, style, provider, model,
+                                     output_dir, reference_path, parallel, quiet,
+                                     api_key, client, bucket)
+    finally:
+        await _close_client(provider, client)
+
+
+async def _generate_poses(description: str, poses: list, style: str,
+                          provider: str, model: str, output_dir: Path,
+                          reference_path: Path, parallel: int, quiet: bool,
+                          api_key: str, client, bucket) -> dict:
+    """Generate every pose with one client, chaining from the first result."""
     results = {
         "description": description,
         "style": style,
@@ -183,14 +283,20 @@ def generate_character_sheet(description: str, poses: list, style: str,
     if not quiet:
         print(f"Generating base character: {first_pose}")
 
-    first_result = generate_with_reference(
+    first_reference = await _preload_reference(reference_path, provider)
+    if bucket:
+        await bucket.acquire()
+    first_result = await generate_with_reference(
         description=description,
         pose=first_pose,
         reference_path=reference_path,
         style=style,
         provider=provider,
         model=model,
-        output_path=first_output
+        output_path=first_output,
+        api_key=api_key,
+        client=client,
+        reference=first_reference
     )
 
     if first_result["success"]:
@@ -201,49 +307,58 @@ def generate_character_sheet(description: str, poses: list, style: str,
         })
         # Use this as reference for remaining poses
         reference_for_remaining = Path(first_result["file"])
+        remaining_reference = await _preload_reference(reference_for_remaining, provider)
     else:
         results["errors"].append({"pose": first_pose, "error": first_result["error"]})
         # Continue without reference
         reference_for_remaining = reference_path
+        remaining_reference = first_reference
 
     # Generate remaining poses
     remaining_poses = poses[1:]
     if remaining_poses:
-        def generate_pose(pose_info):
-            idx, pose = pose_info
+        semaphore = asyncio.Semaphore(max(parallel, 1))
+
+        async def generate_pose(idx, pose):
             output_path = output_dir / f"character_{idx:02d}_{pose.replace(' ', '_')}.png"
-            return generate_with_reference(
-                description=description,
-                pose=pose,
-                reference_path=reference_for_remaining,
-                style=style,
-                provider=provider,
-                model=model,
-                output_path=output_path
-            ), idx
-
-        with ThreadPoolExecutor(max_workers=parallel) as executor:
-            futures = {
-                executor.submit(generate_pose, (i + 2, pose)): pose
-                for i, pose in enumerate(remaining_poses)
-            }
-
-            for future in as_completed(futures):
-                pose = futures[future]
-                result, idx = future.result()
-
-                if result["success"]:
-                    results["files"].append({
-                        "file": result["file"],
-                        "pose": pose,
-                        "index": idx
-                    })
-                    if not quiet:
-                        print(f"[{idx}/{len(poses)}] Generated: {pose}")
-                else:
-                    results["errors"].append({"pose": pose, "error": result["error"]})
-                    if not quiet:
-                        print(f"[{idx}/{len(poses)}] Failed: {pose} - {result['error']}")
+            async with semaphore:
+                if bucket:
+                    await bucket.acquire()
+                result = await generate_with_reference(
+                    description=description,
+                    pose=pose,
+                    reference_path=reference_for_remaining,
+                    style=style,
+                    provider=provider,
+                    model=model,
+                    output_path=output_path,
+                    api_key=api_key,
+                    client=client,
+                    reference=remaining_reference
+                )
+            return result, idx, pose
+
+        tasks = [generate_pose(i + 2, pose) for i, pose in enumerate(remaining_poses)]
+        total = len(poses)
+
+        for next_done in asyncio.as_completed(tasks):
+            result, idx, pose = await next_done
+
+            if result["success"]:
+                results["files"].append({
+                    "file": result["file"],
+                    "pose": pose,
+                    "index": idx
+                })
+                if not quiet:
+                    sys.stdout.write(f"[{idx}/{total}] Generated: {pose}\n")
+            else:
+                results["errors"].append({"pose": pose, "error": result["error"]})
+                if not quiet:
+                    sys.stdout.write(f"[{idx}/{total}] Failed: {pose} - {result['error']}\n")
+
+        if not quiet:
+            sys.stdout.flush()
 
     results["success"] = len(results["files"]) > 0
     return results
@@ -262,8 +377,8 @@ def main():
                         help="Provider (google recommended for consistency)")
     parser.add_argument("--model", "-m", help="Model to use")
     parser.add_argument("--output-dir", "-o", help="Output directory")
-    parser.add_argument("--parallel", type=int, default=2,
-                        help="Parallel generation threads")
+    parser.add_argument("--parallel", type=int, default=8,
+                        help="Maximum concurrent generation requests (default: 8)")
     parser.add_argument("--list-presets", action="store_true",
                         help="List pose presets")
     parser.add_argument("--list-styles", action="store_true",
@@ -308,11 +423,7 @@ def main():
     # Validate API key
     valid, msg = validate_api_key(provider)
     if not valid:
-        if args.json:
-            print(json.dumps({"success": False, "error": msg}))
-        else:
-            print_result(False, msg)
-        sys.exit(1)
+        emit_error(msg, args.json)
 
     # Get model
     provider_config = config.get(provider, {})
@@ -327,19 +438,14 @@ def main():
     # Reference image
     reference_path = Path(args.reference) if args.reference else None
     if reference_path and not reference_path.exists():
-        error_msg = f"Reference image not found: {args.reference}"
-        if args.json:
-            print(json.dumps({"success": False, "error": error_msg}))
-        else:
-            print_result(False, error_msg)
-        sys.exit(1)
+        emit_error(f"Reference image not found: {args.reference}", args.json)
 
     # Setup output directory
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     if args.output_dir:
         output_dir = Path(args.output_dir)
     else:
-        desc_slug = args.description.lower().replace(" ", "_")[:20]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        desc_slug = args.description[:20].lower().translate(_SLUG_TABLE)
         output_dir = get_output_dir() / "characters" / f"{desc_slug}_{timestamp}"
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -361,27 +467,27 @@ def main():
         output_dir=output_dir,
         reference_path=reference_path,
         parallel=args.parallel,
-        quiet=args.json
+        quiet=args.json,
+        rpm=provider_config.get("rpm", 0)
     )
 
     # Save metadata
     meta_file = output_dir / "character_meta.json"
-    with open(meta_file, "w") as f:
-        json.dump({
-            "description": args.description,
-            "style": args.style,
-            "poses": poses,
-            "provider": provider,
-            "model": model,
-            "reference": str(reference_path) if reference_path else None,
-            "files": [f["file"] for f in results["files"]]
-        }, f, indent=2)
+    meta_file.write_bytes(json_dumps({
+        "description": args.description,
+        "style": args.style,
+        "poses": poses,
+        "provider": provider,
+        "model": model,
+        "reference": str(reference_path) if reference_path else None,
+        "files": [f["file"] for f in results["files"]]
+    }))
 
     results["metadata_file"] = str(meta_file)
 
     # Output results
     if args.json:
-        print(json.dumps(results, indent=2))
+        print_json(results)
     else:
         print()
         if results["success"]:
@@ -14,10 +14,12 @@ Options:
 """
 
 import argparse
-import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import itertools
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Optional
 
 # Add scripts directory to path for imports
 import sys
@@ -26,10 +28,113 @@ sys.path.insert(0, str(SCRIPT_DIR))
 
 from config import get_output_dir
 from providers import get_provider
-from utils import format_size_for_openai, format_aspect_ratio_for_google, estimate_cost
+from utils import (
+    format_size_for_openai, format_aspect_ratio_for_google, estimate_cost,
+    ensure_dir, json_dumps, print_json, validate_api_key, HAS_ORJSON
+)
+
+
+@dataclass
+class ComparisonResult:
+    """Outcome of one comparison run, one result dict per provider."""
+    prompt: str
+    timestamp: str
+    google: Optional[Dict[str, Any]] = None
+    openai: Optional[Dict[str, Any]] = None
+
+    @property
+    def success_count(self) -> int:
+        """Number of providers that produced an image."""
+        return sum(1 for r in (self.google, self.openai) if r and r.get("success"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization."""
+        return {
+            "prompt": self.prompt,
+            "timestamp": self.timestamp,
+            "google": self.google,
+            "openai": self.openai
+        }
+
+
+def reserve_run_id(output_dir: Path, timestamp: str) -> str:
+    """Claim a unique run id by creating its metadata file exclusively.
+
+    Comparisons started within the same second get a numeric suffix
+    (``<timestamp>_2``, ...) instead of overwriting each other's images.
+    """
+    run_id = timestamp
+    for n in itertools.count(2):
+        try:
+            (output_dir / f"compare_{run_id}_meta.json").open("x").close()
+            return run_id
+        except FileExistsError:
+            run_id = f"{timestamp}_{n}"
+
+
+async def run_comparison(args, google_output: Path, openai_output: Path,
+                         results: ComparisonResult) -> None:
+    """Run the providers concurrently, recording results as they finish."""
+    def generate_google():
+        provider = get_provider("google", model=args.google_model)
+        aspect_ratio = format_aspect_ratio_for_google(args.size)
+        return provider.generate(args.prompt, google_output, aspect_ratio=aspect_ratio)
 
+    def generate_openai():
+        provider = get_provider("openai", model=args.openai_model)
+        size = format_size_for_openai(args.size)
+        return provider.generate(args.prompt, openai_output, size=size)
 
-def main():
+    def record(provider_name, result, error):
+        if error is not None:
+            setattr(results, provider_name, {"success": False, "error": str(error)})
+            if not args.json:
+                print(f"[FAIL] {provider_name.upper()}: {error}")
+            return
+
+        setattr(results, provider_name, result.to_dict())
+
+        if not args.json:
+            if result.success and result.files:
+                print(f"[OK] {provider_name.upper()}: {result.files[0]}")
+            elif result.success:
+                print(f"[OK] {provider_name.upper()}: (no output file)")
+            else:
+                print(f"[FAIL] {provider_name.upper()}: {result.error}")
+
+    async def run(provider_name, generate):
+        # Provider SDKs are blocking, so each request waits in its own thread
+        try:
+            return provider_name, await asyncio.to_thread(generate), None
+        except Exception as e:
+            return provider_name, None, e
+
+    # Providers without an API key fail up front instead of taking a thread
+    pending = {}
+    for provider_name, generate in (("google", generate_google), ("openai", generate_openai)):
+        valid, msg = validate_api_key(provider_name)
+        if valid:
+            pending[provider_name] = generate
+        else:
+            record(provider_name, None, msg)
+
+    # A single provider has nothing to overlap with, so call it directly
+    if len(pending) == 1:
+        (provider_name, generate), = pending.items()
+        try:
+            record(provider_name, generate(), None)
+        except Exception as e:
+            record(provider_name, None, e)
+        return
+
+    tasks = [run(provider_name, generate) for provider_name, generate in pending.items()]
+
+    for next_done in asyncio.as_completed(tasks):
+        record(*await next_done)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser."""
     parser = argparse.ArgumentParser(description="Compare image generation providers")
     parser.add_argument("--prompt", "-p", required=True, help="Image prompt")
     parser.add_argument("--google-model", default="gemini-2.5-flash-image",
@@ -39,27 +144,30 @@ def main():
     parser.add_argument("--output-dir", "-o", help="Output directory")
     parser.add_argument("--size", "-s", default="1:1", help="Size/aspect ratio")
     parser.add_argument("--json", action="store_true", help="Output as JSON")
+    return parser
 
-    args = parser.parse_args()
+
+# Built once at import so repeated main() calls reuse it
+_PARSER = _build_parser()
+
+
+def main(argv=None):
+    args = _PARSER.parse_args(argv)
 
     # Setup output directory
     if args.output_dir:
         output_dir = Path(args.output_dir)
     else:
         output_dir = get_output_dir() / "comparisons"
-    output_dir.mkdir(parents=True, exist_ok=True)
+    ensure_dir(output_dir)
 
-    # Generate timestamp for this comparison
+    # Generate timestamp for this comparison, once for all of its files
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    google_output = output_dir / f"compare_{timestamp}_google.png"
-    openai_output = output_dir / f"compare_{timestamp}_openai.png"
+    run_id = reserve_run_id(output_dir, timestamp)
+    google_output = output_dir / f"compare_{run_id}_google.png"
+    openai_output = output_dir / f"compare_{run_id}_openai.png"
 
-    results = {
-        "prompt": args.prompt,
-        "timestamp": timestamp,
-        "google": None,
-        "openai": None
-    }
+    results = ComparisonResult(prompt=args.prompt, timestamp=timestamp)
 
     if not args.json:
         print(f"Generating images for: \"{args.prompt[:50]}...\"")
@@ -67,49 +175,17 @@ def main():
         print(f"OpenAI model: {args.openai_model}")
         print()
 
-    # Define generation tasks
-    def generate_google():
-        provider = get_provider("google", model=args.google_model)
-        aspect_ratio = format_aspect_ratio_for_google(args.size)
-        return provider.generate(args.prompt, google_output, aspect_ratio=aspect_ratio)
-
-    def generate_openai():
-        provider = get_provider("openai", model=args.openai_model)
-        size = format_size_for_openai(args.size)
-        return provider.generate(args.prompt, openai_output, size=size)
-
     # Generate in parallel
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = {
-            executor.submit(generate_google): "google",
-            executor.submit(generate_openai): "openai"
-        }
+    asyncio.run(run_comparison(args, google_output, openai_output, results))
 
-        for future in as_completed(futures):
-            provider_name = futures[future]
-            try:
-                result = future.result()
-                results[provider_name] = result.to_dict()
-
-                if not args.json:
-                    if result.success and result.files:
-                        print(f"[OK] {provider_name.upper()}: {result.files[0]}")
-                    elif result.success:
-                        print(f"[OK] {provider_name.upper()}: (no output file)")
-                    else:
-                        print(f"[FAIL] {provider_name.upper()}: {result.error}")
-            except Exception as e:
-                results[provider_name] = {"success": False, "error": str(e)}
-                if not args.json:
-                    print(f"[FAIL] {provider_name.upper()}: {e}")
-
-    # Save comparison metadata
-    meta_file = output_dir / f"compare_{timestamp}_meta.json"
-    with open(meta_file, "w") as f:
-        json.dump(results, f, indent=2)
+    # Save comparison metadata; the stdlib indent printer is much slower than
+    # compact output, so only indent when orjson does it natively
+    meta_file = output_dir / f"compare_{run_id}_meta.json"
+    with open(meta_file, "wb") as f:
+        f.write(json_dumps(results.to_dict(), indent=HAS_ORJSON))
 
     if args.json:
-        print(json.dumps(results, indent=2))
+        print_json(results.to_dict())
     else:
         print()
         print("Comparison complete!")
@@ -123,11 +199,7 @@ def main():
         print(f"  OpenAI ({args.openai_model}): {openai_cost}")
 
         # Summary
-        success_count = sum(
-            1 for r in [results["google"], results["openai"]]
-            if r and r.get("success")
-        )
-        print(f"\nSuccess: {success_count}/2 providers")
+        print(f"\nSuccess: {results.success_count}/2 providers")
 
 
 if __name__ == "__main__":
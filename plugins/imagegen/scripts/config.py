@@ -4,11 +4,11 @@ Configuration management for imagegen plugin.
 Handles API keys, default settings, and output directories.
 """
 
-import copy
 import json
-import os
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+
+from utils import ensure_dir, env_api_key, json_loads
 
 # Default configuration
 DEFAULT_CONFIG = {
@@ -17,7 +17,9 @@ DEFAULT_CONFIG = {
     "google": {
         "model": "gemini-2.5-flash-image",  # or "gemini-3-pro-image-preview"
         "aspect_ratio": "1:1",
-        "response_modalities": ["IMAGE"]
+        "response_modalities": ["IMAGE"],
+        "history_turns": 3,  # most recent session steps sent when iterating; 0 = all
+        "rpm": 60  # requests per minute for moodboards and character sheets; 0 = unlimited
     },
     "openai": {
         # gpt-image-2 (released 2026-04-21) is now on /v1/images/generations
@@ -27,7 +29,8 @@ DEFAULT_CONFIG = {
         "model": "gpt-image-2",  # or "gpt-image-1.5", "gpt-image-1", "gpt-image-1-mini"
         "size": "1024x1024",
         "quality": "high",
-        "background": "auto"
+        "background": "auto",
+        "rpm": 60  # requests per minute for moodboards and character sheets; 0 = unlimited
     },
     "naming": {
         "prefix": "img",
@@ -36,30 +39,72 @@ DEFAULT_CONFIG = {
     }
 }
 
+def _copy_value(value: Any) -> Any:
+    """Copy a list or dict one level deep; other config values are immutable."""
+    if isinstance(value, dict):
+        return {k: list(v) if isinstance(v, list) else v for k, v in value.items()}
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+def _copy_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a config dict; sections are at most two levels deep."""
+    return {key: _copy_value(value) for key, value in config.items()}
+
+def _fresh_defaults() -> Dict[str, Any]:
+    """Get a mutable copy of DEFAULT_CONFIG."""
+    return _copy_config(DEFAULT_CONFIG)
+
 def get_config_path() -> Path:
     """Get the path to the config file."""
     # Store config in user's home directory
-    config_dir = Path.home() / ".config" / "claude-imagegen"
-    config_dir.mkdir(parents=True, exist_ok=True)
+    config_dir = ensure_dir(Path.home() / ".config" / "claude-imagegen")
     return config_dir / "config.json"
 
+# Parsed configuration keyed by (config path, mtime_ns) so repeated lookups
+# within one run skip re-reading the file until it changes on disk
+_CONFIG_CACHE: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
 def load_config() -> Dict[str, Any]:
     """Load configuration from file, merging with defaults."""
     config_path = get_config_path()
-    config = copy.deepcopy(DEFAULT_CONFIG)
-
-    if config_path.exists():
-        try:
-            with open(config_path, "r") as f:
-                user_config = json.load(f)
-                # Deep merge
-                for key, value in user_config.items():
-                    if isinstance(value, dict) and key in config:
-                        config[key] = {**config[key], **value}
-                    else:
-                        config[key] = value
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Warning: Could not load config: {e}")
+    try:
+        mtime_ns = config_path.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = 0
+
+    key = (str(config_path), mtime_ns)
+    if key not in _CONFIG_CACHE:
+        _CONFIG_CACHE.clear()
+        _CONFIG_CACHE[key] = _read_config(config_path)
+
+    # Callers may mutate the result (set_config_value), so hand out a copy
+    return _copy_config(_CONFIG_CACHE[key])
+
+def _read_config(config_path: Path) -> Dict[str, Any]:
+    """Read the config file and merge it over the defaults."""
+    config = _fresh_defaults()
+
+    try:
+        raw = config_path.read_bytes()
+    except FileNotFoundError:
+        return config
+    except IOError as e:
+        print(f"Warning: Could not load config: {e}")
+        return config
+
+    try:
+        user_config = json_loads(raw)
+    except json.JSONDecodeError as e:
+        print(f"Warning: Could not load config: {e}")
+        return config
+
+    # Deep merge
+    for key, value in user_config.items():
+        if isinstance(value, dict) and key in config:
+            config[key] = {**config[key], **value}
+        else:
+            config[key] = value
 
     return config
 
@@ -68,15 +113,12 @@ def save_config(config: Dict[str, Any]) -> None:
     config_path = get_config_path()
     with open(config_path, "w") as f:
         json.dump(config, f, indent=2)
+    _CONFIG_CACHE.clear()
     print(f"Configuration saved to {config_path}")
 
 def get_api_key(provider: str) -> Optional[str]:
     """Get API key for the specified provider from environment."""
-    if provider == "google":
-        return os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
-    elif provider == "openai":
-        return os.environ.get("OPENAI_API_KEY")
-    return None
+    return env_api_key(provider)
 
 def set_config_value(key: str, value: Any) -> None:
     """Set a specific configuration value."""
@@ -116,9 +158,7 @@ def print_config() -> None:
 def get_output_dir() -> Path:
     """Get the output directory, creating it if necessary."""
     config = load_config()
-    output_dir = Path(config.get("output_dir", "./generated-images"))
-    output_dir.mkdir(parents=True, exist_ok=True)
-    return output_dir
+    return ensure_dir(Path(config.get("output_dir", "./generated-images")))
 
 if __name__ == "__main__":
     import sys
@@ -14,34 +14,44 @@ Options:
 """
 
 import argparse
-import json
 import sys
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 # Add scripts directory to path for imports
 SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
-from config import load_config, get_output_dir
+from config import load_config
 from providers import get_provider
-from utils import print_result, validate_api_key, format_size_for_openai
+from utils import (
+    print_result, validate_api_key, format_size_for_openai, ensure_dir,
+    print_json, is_safe_output_path, emit_error
+)
 
 
-def is_safe_output_path(output_path: Path) -> bool:
-    """Validate output path to prevent directory traversal attacks."""
-    try:
-        resolved = output_path.resolve()
-        # Don't allow writing to system directories
-        dangerous_prefixes = ['/etc', '/usr', '/bin', '/sbin', '/var', '/root']
-        for prefix in dangerous_prefixes:
-            if str(resolved).startswith(prefix):
-                return False
-        return True
-    except Exception:
-        return False
+@dataclass(frozen=True)
+class EditSettings:
+    """Provider, model and output location resolved once from args + config."""
+    provider: str
+    model: Optional[str]
+    output_dir: Path
 
 
-def main():
+def resolve_settings(args: argparse.Namespace) -> EditSettings:
+    """Merge command-line arguments over the config file in a single pass."""
+    config = load_config()
+    provider = args.provider or config.get("default_provider", "google")
+    return EditSettings(
+        provider=provider,
+        model=args.model or config.get(provider, {}).get("model"),
+        output_dir=Path(config.get("output_dir", "./generated-images")),
+    )
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser."""
     parser = argparse.ArgumentParser(description="Edit images with AI")
     parser.add_argument("--image", "-i", required=True, help="Input image path")
     parser.add_argument("--prompt", "-p", required=True, help="Edit instructions")
@@ -54,58 +64,43 @@ def main():
                         help="Output size (OpenAI only)")
     parser.add_argument("--json", action="store_true",
                         help="Output result as JSON")
+    return parser
+
 
-    args = parser.parse_args()
+# Built once at import so repeated main() calls reuse it
+_PARSER = _build_parser()
+
+
+def main(argv=None):
+    args = _PARSER.parse_args(argv)
 
     # Validate input image exists
     image_path = Path(args.image)
     if not image_path.exists():
-        error_msg = f"Input image not found: {args.image}"
-        if args.json:
-            print(json.dumps({"success": False, "error": error_msg}))
-        else:
-            print_result(False, error_msg)
-        sys.exit(1)
-
-    # Load configuration
-    config = load_config()
+        emit_error(f"Input image not found: {args.image}", args.json)
 
-    # Determine provider
-    provider_name = args.provider or config.get("default_provider", "google")
+    # Resolve provider, model and output directory from args + config
+    settings = resolve_settings(args)
+    provider_name = settings.provider
 
     # Validate API key
     valid, msg = validate_api_key(provider_name)
     if not valid:
-        if args.json:
-            print(json.dumps({"success": False, "error": msg}))
-        else:
-            print_result(False, msg)
-        sys.exit(1)
-
-    # Get provider-specific config
-    provider_config = config.get(provider_name, {})
-
-    # Determine model
-    model = args.model or provider_config.get("model")
-
-    # Get provider instance
-    provider = get_provider(provider_name, model=model)
+        emit_error(msg, args.json)
 
     # Determine output path
     if args.output:
         output_path = Path(args.output)
         if not is_safe_output_path(output_path):
-            error_msg = f"Unsafe output path: {args.output}"
-            if args.json:
-                print(json.dumps({"success": False, "error": error_msg}))
-            else:
-                print_result(False, error_msg)
-            sys.exit(1)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+            emit_error(f"Unsafe output path: {args.output}", args.json)
+        ensure_dir(output_path.parent)
     else:
-        output_dir = get_output_dir()
+        ensure_dir(settings.output_dir)
         filename = f"{image_path.stem}_edited.png"
-        output_path = output_dir / filename
+        output_path = settings.output_dir / filename
+
+    # Get provider instance
+    provider = get_provider(provider_name, model=settings.model)
 
     # Build provider-specific kwargs
     kwargs = {}
@@ -124,7 +119,7 @@ def main():
 
     # Output result
     if args.json:
-        print(json.dumps(result.to_dict(), indent=2))
+        print_json(result.to_dict())
     else:
         if result.success:
             print_result(
@@ -12,11 +12,11 @@ Options:
     --quality low|medium|high  Quality level (OpenAI only)
     --output PATH              Output file path
     --count N                  Number of images to generate (1-4)
+    --batch                    Use the Gemini Batch API when --count is above 4
     --background transparent|opaque  Background type (OpenAI GPT-Image only)
 """
 
 import argparse
-import json
 import sys
 from pathlib import Path
 
@@ -28,24 +28,11 @@ from config import load_config, get_output_dir
 from providers import get_provider
 from utils import (
     generate_filename, print_result, validate_api_key,
-    format_size_for_openai, format_aspect_ratio_for_google, estimate_cost
+    format_size_for_openai, format_aspect_ratio_for_google, estimate_cost,
+    ensure_dir, print_json, is_safe_output_path, emit_error
 )
 
 
-def is_safe_output_path(output_path: Path) -> bool:
-    """Validate output path to prevent directory traversal attacks."""
-    try:
-        resolved = output_path.resolve()
-        # Don't allow writing to system directories
-        dangerous_prefixes = ['/etc', '/usr', '/bin', '/sbin', '/var', '/root']
-        for prefix in dangerous_prefixes:
-            if str(resolved).startswith(prefix):
-                return False
-        return True
-    except Exception:
-        return False
-
-
 def main():
     parser = argparse.ArgumentParser(description="Generate images with AI")
     parser.add_argument("--prompt", "-p", required=True, help="Image prompt")
@@ -60,6 +47,9 @@ def main():
                         help="Number of images to generate")
     parser.add_argument("--background", "-b", choices=["transparent", "opaque", "auto"],
                         default="auto", help="Background type (OpenAI GPT-Image only)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Use the Gemini Batch API when --count is above 4 "
+                             "(cheaper, but runs asynchronously; Google only)")
     parser.add_argument("--json", action="store_true",
                         help="Output result as JSON")
 
@@ -74,11 +64,7 @@ def main():
     # Validate API key
     valid, msg = validate_api_key(provider_name)
     if not valid:
-        if args.json:
-            print(json.dumps({"success": False, "error": msg}))
-        else:
-            print_result(False, msg)
-        sys.exit(1)
+        emit_error(msg, args.json)
 
     # Get provider-specific config
     provider_config = config.get(provider_name, {})
@@ -86,25 +72,20 @@ def main():
     # Determine model
     model = args.model or provider_config.get("model")
 
-    # Get provider instance
-    provider = get_provider(provider_name, model=model)
-
     # Determine output path
     if args.output:
         output_path = Path(args.output)
         if not is_safe_output_path(output_path):
-            error_msg = f"Unsafe output path: {args.output}"
-            if args.json:
-                print(json.dumps({"success": False, "error": error_msg}))
-            else:
-                print_result(False, error_msg)
-            sys.exit(1)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+            emit_error(f"Unsafe output path: {args.output}", args.json)
+        ensure_dir(output_path.parent)
     else:
         output_dir = get_output_dir()
         filename = generate_filename(args.prompt)
         output_path = output_dir / filename
 
+    # Get provider instance
+    provider = get_provider(provider_name, model=model)
+
     # Build provider-specific kwargs
     if provider_name == "google":
         aspect_ratio = args.size or provider_config.get("aspect_ratio", "1:1")
@@ -121,18 +102,26 @@ def main():
             "count": args.count,
         }
 
-    # Generate
-    result = provider.generate(
-        prompt=args.prompt,
-        output_path=output_path,
-        **kwargs
-    )
+    # Generate; large Google counts can go through the batch API instead
+    if provider_name == "google" and args.batch and args.count > 4:
+        kwargs["count"] = args.count
+        result = provider.generate_batch(
+            prompt=args.prompt,
+            output_path=output_path,
+            **kwargs
+        )
+    else:
+        result = provider.generate(
+            prompt=args.prompt,
+            output_path=output_path,
+            **kwargs
+        )
 
     # Output result
     result_dict = result.to_dict()
 
     if args.json:
-        print(json.dumps(result_dict, indent=2))
+        print_json(result_dict)
     else:
         if result.success:
             print_result(
@@ -18,105 +18,351 @@ Options:
 
 import argparse
 import json
+import os
 import sys
 import uuid
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 # Add scripts directory to path for imports
 SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
 from config import load_config, get_output_dir
-from providers import get_provider
-from utils import print_result, validate_api_key
+from utils import (
+    print_result, validate_api_key, ensure_dir, is_safe_output_path, emit_error,
+    json_dumps, json_loads, print_json, resolve_path
+)
+
+# msgpack is optional; with CLAUDE_IMAGEGEN_FORMAT=msgpack new sessions are
+# logged as MessagePack records instead of JSON Lines (smaller, faster to parse)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # Session storage
 SESSIONS_DIR = Path.home() / ".config" / "claude-imagegen" / "sessions"
 
+# Session log formats, by file extension; new sessions use SESSION_SUFFIX
+LOG_SUFFIXES = (".jsonl", ".msgpack")
+SESSION_SUFFIX = (
+    ".msgpack"
+    if msgpack is not None and os.environ.get("CLAUDE_IMAGEGEN_FORMAT") == "msgpack"
+    else ".jsonl"
+)
 
-def is_safe_output_path(output_path: Path) -> bool:
-    """Validate output path to prevent directory traversal attacks."""
-    try:
-        resolved = output_path.resolve()
-        # Don't allow writing to system directories
-        dangerous_prefixes = ['/etc', '/usr', '/bin', '/sbin', '/var', '/root']
-        for prefix in dangerous_prefixes:
-            if str(resolved).startswith(prefix):
-                return False
-        return True
-    except Exception:
-        return False
+# Summary records ({id, created, provider, steps}), appended whenever a
+# session changes; the last record for an id wins. list_sessions reads only
+# this file instead of parsing every session.
+INDEX_NAME = "_index.jsonl"
+
+# Parsed session files keyed by path, with the mtime_ns they were read at, so
+# repeated loads and listings within one run only re-parse changed files
+_SESSION_CACHE: Dict[str, Tuple[int, dict]] = {}
 
 
 def get_session_path(session_id: str) -> Path:
-    """Get path to session file."""
+    """Get path a new session log is written to.
+
+    Sessions are stored as logs of records: the first holds the session
+    fields, each following one a history entry, so a new step is an append
+    rather than a rewrite of the whole file.
+    """
     SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
-    return SESSIONS_DIR / f"{session_id}.json"
+    return SESSIONS_DIR / f"{session_id}{SESSION_SUFFIX}"
+
+
+def _session_paths(session_id: str) -> list:
+    """Get every path a session may be stored at, in lookup order.
+
+    Logs in the configured format come first, then the other log format,
+    then the single-document .json file used by older versions.
+    """
+    suffixes = sorted(LOG_SUFFIXES, key=lambda suffix: suffix != SESSION_SUFFIX)
+    return [SESSIONS_DIR / f"{session_id}{suffix}" for suffix in (*suffixes, ".json")]
+
+
+def _encode_line(obj: dict) -> bytes:
+    """Encode one JSON Lines record."""
+    return json_dumps(obj, indent=False) + b"\n"
+
 
+def _encode_record(obj: dict, suffix: str) -> bytes:
+    """Encode one session log record in the format for a log extension."""
+    if suffix == ".msgpack":
+        return msgpack.packb(obj, use_bin_type=True)
+    return _encode_line(obj)
 
-def create_session(image_path: Path, prompt: str, provider: str, model: str) -> dict:
-    """Create a new iteration session."""
+
+def _encode_session(session: dict, suffix: str) -> bytes:
+    """Encode a whole session as a log: header record, then one per history entry."""
+    header = {key: value for key, value in session.items() if key != "history"}
+    return b"".join(_encode_record(record, suffix) for record in [header, *session["history"]])
+
+
+def create_session(image_path: Path, prompt: str, provider: str, model: str,
+                   timestamp: Optional[str] = None) -> dict:
+    """Create a new iteration session.
+
+    timestamp (ISO 8601) stamps both the session and its initial step;
+    defaults to now.
+    """
     session_id = str(uuid.uuid4())[:8]
+    timestamp = timestamp or datetime.now().isoformat()
 
     session = {
         "id": session_id,
-        "created": datetime.now().isoformat(),
+        "created": timestamp,
         "provider": provider,
         "model": model,
         "history": [
             {
                 "step": 0,
                 "type": "initial",
-                "image": str(image_path.resolve()),
+                "image": str(resolve_path(image_path)),
                 "prompt": prompt,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": timestamp
             }
         ]
     }
 
     # Save session
-    session_path = get_session_path(session_id)
-    with open(session_path, "w") as f:
-        json.dump(session, f, indent=2)
+    save_session(session)
 
     return session
 
 
+def _copy_session(session: dict) -> dict:
+    """Copy a session so callers can append to its history without touching the cache."""
+    return {**session, "history": list(session["history"])}
+
+
+def _parse_session(session_path: Path) -> dict:
+    """Parse a session log, or a legacy single-document .json session."""
+    data = session_path.read_bytes()
+    if session_path.suffix == ".json":
+        return json_loads(data)
+
+    if session_path.suffix == ".msgpack":
+        if msgpack is None:
+            raise ImportError("msgpack package not installed. Run: pip install msgpack")
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(data)
+        try:
+            header = unpacker.unpack()
+        except (ValueError, msgpack.OutOfData):
+            header = None
+        # Iteration stops at a truncated trailing object (an interrupted
+        # append); corrupt bytes end the log there too
+        entries = []
+        try:
+            for entry in unpacker:
+                entries.append(entry)
+        except ValueError:
+            pass
+    else:
+        header, *lines = data.splitlines() or [b""]
+        try:
+            header = json_loads(header)
+        except ValueError:
+            header = None
+        entries = []
+        for line in lines:
+            # Blank or torn lines (e.g. an interrupted append) are skipped
+            try:
+                entries.append(json_loads(line))
+            except ValueError:
+                continue
+
+    if not isinstance(header, dict):
+        # An empty or torn header leaves nothing to resume from
+        raise ValueError(f"Corrupt session file: {session_path.name}")
+    header["history"] = entries
+    return header
+
+
+def _log_ends_cleanly(session_path: Path) -> bool:
+    """Check that a session log ends on a record boundary.
+
+    An interrupted append leaves a torn record at the end; appending after
+    it would fuse the new record onto the torn bytes and lose it as well.
+    """
+    if session_path.suffix == ".msgpack":
+        data = session_path.read_bytes()
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(data)
+        end = 0
+        try:
+            for _ in unpacker:
+                end = unpacker.tell()
+        except ValueError:
+            pass
+        return end == len(data)
+
+    with open(session_path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _read_session_file(session_path: Path) -> dict:
+    """Parse a session file, reusing the cached parse while its mtime is unchanged.
+
+    Raises:
+        OSError: If the file cannot be read (FileNotFoundError if missing).
+        ValueError: If the file's header is empty or corrupt.
+    """
+    key = str(session_path)
+    mtime_ns = session_path.stat().st_mtime_ns
+    cached = _SESSION_CACHE.get(key)
+    if cached is None or cached[0] != mtime_ns:
+        cached = (mtime_ns, _parse_session(session_path))
+        _SESSION_CACHE[key] = cached
+    return cached[1]
+
+
 def load_session(session_id: str) -> dict:
     """Load an existing session."""
-    session_path = get_session_path(session_id)
-    if not session_path.exists():
-        return None
+    for session_path in _session_paths(session_id):
+        try:
+            return _copy_session(_read_session_file(session_path))
+        except FileNotFoundError:
+            continue
+    return None
 
-    with open(session_path, "r") as f:
-        return json.load(f)
+
+def _cache_session(session_path: Path, session: dict) -> None:
+    """Record a session just written by this process in the parse cache."""
+    _SESSION_CACHE[str(session_path)] = (session_path.stat().st_mtime_ns, _copy_session(session))
 
 
 def save_session(session: dict) -> None:
-    """Save session state."""
+    """Save full session state, replacing any existing log."""
     session_path = get_session_path(session["id"])
-    with open(session_path, "w") as f:
-        json.dump(session, f, indent=2)
+    session_path.write_bytes(_encode_session(session, SESSION_SUFFIX))
+    _cache_session(session_path, session)
+
+    # The new log supersedes a legacy .json file or a log in the other format
+    for other_path in _session_paths(session["id"]):
+        if other_path != session_path:
+            other_path.unlink(missing_ok=True)
+    _index_session(session)
+
+
+def append_history(session: dict, entry: dict) -> None:
+    """Add a history entry to a session and append it to the session log."""
+    session["history"].append(entry)
+
+    # Append to the session's existing log, whichever format it is in
+    session_path = next(
+        (path for path in _session_paths(session["id"])
+         if path.suffix in LOG_SUFFIXES and path.exists()),
+        None
+    )
+    if session_path is None or not _log_ends_cleanly(session_path):
+        # Legacy .json session: convert it to a log on its first new step.
+        # A log with a torn tail is rewritten from the loaded session, which
+        # already skipped the torn record
+        save_session(session)
+        return
+
+    with open(session_path, "ab") as f:
+        f.write(_encode_record(entry, session_path.suffix))
+    _cache_session(session_path, session)
+    _index_session(session)
+
+
+def _summarize(session: dict) -> dict:
+    """Build the summary record listed for a session."""
+    return {
+        "id": session["id"],
+        "created": session["created"],
+        "provider": session["provider"],
+        "steps": len(session["history"])
+    }
+
+
+def _index_session(session: dict) -> None:
+    """Append a session's current summary to the index.
+
+    Only an existing index is appended to; when there is none yet,
+    list_sessions builds it from all session files on its next call.
+    """
+    try:
+        # O_APPEND without O_CREAT: fails rather than starting a partial index
+        fd = os.open(SESSIONS_DIR / INDEX_NAME, os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        return
+    try:
+        os.write(fd, _encode_line(_summarize(session)))
+    finally:
+        os.close(fd)
+
+
+def _scan_sessions() -> Tuple[list, bool]:
+    """Summarize every session file in SESSIONS_DIR.
+
+    Returns:
+        (summaries, complete); complete is False when msgpack logs had to be
+        skipped because msgpack is not installed.
+    """
+    sessions = []
+    complete = True
+
+    session_files = [
+        path for suffix in LOG_SUFFIXES for path in SESSIONS_DIR.glob(f"*{suffix}")
+        if path.name != INDEX_NAME
+    ]
+    # Legacy sessions that have not been converted to a log yet
+    converted = {path.stem for path in session_files}
+    session_files.extend(
+        path for path in SESSIONS_DIR.glob("*.json") if path.stem not in converted
+    )
+
+    for session_file in session_files:
+        try:
+            sessions.append(_summarize(_read_session_file(session_file)))
+        except ImportError:
+            complete = False
+        except (json.JSONDecodeError, KeyError, ValueError):
+            continue
+
+    return sessions, complete
+
+
+def _write_index(sessions: list) -> None:
+    """Replace the index with one record per session."""
+    (SESSIONS_DIR / INDEX_NAME).write_bytes(b"".join(map(_encode_line, sessions)))
 
 
 def list_sessions() -> list:
     """List all active sessions."""
     SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
-    sessions = []
 
-    for session_file in SESSIONS_DIR.glob("*.json"):
-        try:
-            with open(session_file, "r") as f:
-                session = json.load(f)
-                sessions.append({
-                    "id": session["id"],
-                    "created": session["created"],
-                    "provider": session["provider"],
-                    "steps": len(session["history"])
-                })
-        except (json.JSONDecodeError, KeyError):
-            continue
+    try:
+        lines = (SESSIONS_DIR / INDEX_NAME).read_bytes().splitlines()
+    except FileNotFoundError:
+        # First listing (or index removed): build it from the session files
+        sessions, complete = _scan_sessions()
+        # An index missing unreadable sessions would hide them for good
+        if complete:
+            _write_index(sessions)
+    else:
+        latest = {}
+        for line in lines:
+            try:
+                record = json_loads(line)
+                latest[record["id"]] = record
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+        sessions = list(latest.values())
+
+        # Drop superseded records once they make up most of the file
+        if len(lines) > 2 * len(sessions) + 16:
+            _write_index(sessions)
 
     return sorted(sessions, key=lambda x: x["created"], reverse=True)
 
@@ -140,7 +386,7 @@ def main():
     if args.list:
         sessions = list_sessions()
         if args.json:
-            print(json.dumps(sessions, indent=2))
+            print_json(sessions)
         else:
             if sessions:
                 print("Active iteration sessions:")
@@ -152,10 +398,13 @@ def main():
 
     # Show session history
     if args.history and args.session:
-        session = load_session(args.session)
+        try:
+            session = load_session(args.session)
+        except ValueError as e:
+            emit_error(str(e), args.json)
         if session:
             if args.json:
-                print(json.dumps(session["history"], indent=2))
+                print_json(session["history"])
             else:
                 print(f"Session {session['id']} history:")
                 for entry in session["history"]:
@@ -170,27 +419,26 @@ def main():
         print("Error: --prompt is required for iteration")
         sys.exit(1)
 
+    # Imported here so --list and --history don't load the provider modules
+    from providers import get_provider
+
+    # One timestamp for everything this invocation records
+    now_iso = datetime.now().isoformat()
+
     config = load_config()
 
     # Either continue session or start new one
     if args.session:
-        session = load_session(args.session)
+        try:
+            session = load_session(args.session)
+        except ValueError as e:
+            emit_error(str(e), args.json)
         if not session:
-            error_msg = f"Session not found: {args.session}"
-            if args.json:
-                print(json.dumps({"success": False, "error": error_msg}))
-            else:
-                print_result(False, error_msg)
-            sys.exit(1)
+            emit_error(f"Session not found: {args.session}", args.json)
     elif args.image:
         image_path = Path(args.image)
         if not image_path.exists():
-            error_msg = f"Image not found: {args.image}"
-            if args.json:
-                print(json.dumps({"success": False, "error": error_msg}))
-            else:
-                print_result(False, error_msg)
-            sys.exit(1)
+            emit_error(f"Image not found: {args.image}", args.json)
 
         provider_name = args.provider or config.get("default_provider", "google")
         provider_config = config.get(provider_name, {})
@@ -198,7 +446,7 @@ def main():
         if not model:
             model = "gemini-2.5-flash-image" if provider_name == "google" else "gpt-image-2"
 
-        session = create_session(image_path, args.prompt, provider_name, model)
+        session = create_session(image_path, args.prompt, provider_name, model, now_iso)
         print(f"Created new session: {session['id']}")
     else:
         print("Error: Either --image (for new session) or --session (to continue) is required")
@@ -207,11 +455,7 @@ def main():
     # Validate API key
     valid, msg = validate_api_key(session["provider"])
     if not valid:
-        if args.json:
-            print(json.dumps({"success": False, "error": msg}))
-        else:
-            print_result(False, msg)
-        sys.exit(1)
+        emit_error(msg, args.json)
 
     # Get provider
     provider = get_provider(session["provider"], model=session["model"])
@@ -228,13 +472,8 @@ def main():
     if args.output:
         output_path = Path(args.output)
         if not is_safe_output_path(output_path):
-            error_msg = f"Unsafe output path: {args.output}"
-            if args.json:
-                print(json.dumps({"success": False, "error": error_msg}))
-            else:
-                print_result(False, error_msg)
-            sys.exit(1)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+            emit_error(f"Unsafe output path: {args.output}", args.json)
+        ensure_dir(output_path.parent)
     else:
         output_dir = get_output_dir()
         step = len(session["history"])
@@ -242,25 +481,27 @@ def main():
         output_path = output_dir / filename
 
     # Perform iteration
-    result = provider.iterate(session, args.prompt, output_path)
+    kwargs = {}
+    if session["provider"] == "google":
+        kwargs["history_turns"] = config.get("google", {}).get("history_turns", 3)
+    result = provider.iterate(session, args.prompt, output_path, **kwargs)
 
     # Update session on success
     if result.success:
-        session["history"].append({
+        append_history(session, {
             "step": len(session["history"]),
             "type": "iteration",
             "image": result.files[0] if result.files else None,
             "prompt": args.prompt,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso
         })
-        save_session(session)
 
     # Output result
     if args.json:
         result_dict = result.to_dict()
         result_dict["session_id"] = session["id"]
         result_dict["step"] = len(session["history"]) - 1
-        print(json.dumps(result_dict, indent=2))
+        print_json(result_dict)
     else:
         if result.success:
             print_result(
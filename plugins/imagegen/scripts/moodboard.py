@@ -14,22 +14,28 @@ Options:
     --aspects               Generate with different aspect ratios
     --provider PROVIDER     Provider to use
     --output-dir PATH       Output directory
+    --batch                 Request up to 4 variations per call (Google only)
+    --no-cache              Don't reuse images cached from identical earlier runs
+    --approx-cache          Also reuse cached images whose prompts are similar
+    --no-dedup              Generate repeated prompts separately instead of copying
 """
 
 import argparse
-import json
+import asyncio
+import itertools
 import os
+import random
+import shutil
 import sys
-from datetime import datetime
+import time
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add scripts directory to path for imports
 SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
-from config import load_config, get_api_key, get_output_dir
-from utils import print_result, validate_api_key, generate_filename
+# datetime and the config/providers/utils modules are imported in main(), so
+# --list-styles and --help return without loading the provider SDKs
 
 # Style modifiers for variety
 STYLE_MODIFIERS = {
@@ -64,108 +70,238 @@ VARIATION_ANGLES = [
 ASPECT_RATIOS = ["1:1", "16:9", "9:16", "4:3"]
 
 
-def generate_image(prompt: str, provider: str, model: str,
-                   aspect_ratio: str, output_path: Path) -> dict:
-    """Generate a single image."""
-    if provider == "google":
-        try:
-            from google import genai
-            from google.genai import types
+# Failed generations whose error mentions one of these are retried with backoff
+RETRYABLE_ERRORS = ("429", "rate limit", "ratelimit", "resource_exhausted", "503", "unavailable")
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 2.0  # seconds, doubled on each retry
 
-            api_key = get_api_key("google")
-            client = genai.Client(api_key=api_key)
+# Most images Gemini returns from one request, the batch size for --batch
+GOOGLE_BATCH_SIZE = 4
 
-            config = types.GenerateContentConfig(
-                response_modalities=["IMAGE"],
-            )
-            if aspect_ratio:
-                config.image_config = types.ImageConfig(aspect_ratio=aspect_ratio)
-
-            response = client.models.generate_content(
-                model=model,
-                contents=[prompt],
-                config=config
-            )
+# OpenAI has no aspect ratio parameter, so map each ratio to a size
+OPENAI_SIZES = {"1:1": "1024x1024", "16:9": "1536x1024", "9:16": "1024x1536", "4:3": "1024x1024"}
 
-            for part in response.parts:
-                if hasattr(part, "inline_data") and part.inline_data:
-                    with open(output_path, "wb") as f:
-                        f.write(part.inline_data.data)
-                    return {"success": True, "file": str(output_path), "prompt": prompt}
 
-            return {"success": False, "error": "No image returned", "prompt": prompt}
-
-        except Exception as e:
-            return {"success": False, "error": str(e), "prompt": prompt}
+async def generate_image(provider, prompt: str, aspect_ratio: str,
+                         output_path: Path, cache: bool = False,
+                         bucket=None, approx_suffix: str = None) -> dict:
+    """Generate a single image.
 
+    With cache, an identical earlier generation is reused without a request
+    (Google only). With approx_suffix as well (the variation's angle), so is
+    the cached image from an earlier run whose prompt has the same suffix and
+    the most similar theme/style. Requests that are made first take a token
+    from bucket.
+    """
+    if provider.name == "google":
+        kwargs = {"aspect_ratio": aspect_ratio}
     else:  # openai
-        try:
-            from openai import OpenAI
-            from utils import save_base64_image
-
-            api_key = get_api_key("openai")
-            client = OpenAI(api_key=api_key)
-
-            size_map = {"1:1": "1024x1024", "16:9": "1536x1024", "9:16": "1024x1536", "4:3": "1024x1024"}
-            size = size_map.get(aspect_ratio, "1024x1024")
-
-            response = client.images.generate(
-                model=model,
-                prompt=prompt,
-                n=1,
-                size=size,
-                quality="high"
-            )
-
-            if response.data:
-                image_data = response.data[0]
-                if hasattr(image_data, "b64_json") and image_data.b64_json:
-                    save_base64_image(image_data.b64_json, output_path)
-                    return {"success": True, "file": str(output_path), "prompt": prompt}
-
-            return {"success": False, "error": "No image returned", "prompt": prompt}
+        kwargs = {"size": OPENAI_SIZES.get(aspect_ratio, "1024x1024"), "quality": "high"}
+        cache = False
+
+    result = None
+    if cache:
+        result = await asyncio.to_thread(provider.cached_result, prompt, output_path, **kwargs)
+        if result is None and approx_suffix:
+            result = await asyncio.to_thread(provider.similar_cached_result, prompt, output_path,
+                                             suffix=approx_suffix, **kwargs)
+    if result is None:
+        if bucket:
+            await bucket.acquire()
+        if cache:
+            kwargs["cache"] = True
+        result = await provider.agenerate(prompt, output_path, **kwargs)
+    if result.success:
+        generated = {"success": True, "file": result.files[0], "prompt": prompt}
+        if "similar_to" in result.metadata:
+            generated["similar_to"] = result.metadata["similar_to"]
+        return generated
+    return {"success": False, "error": result.error or "No image returned", "prompt": prompt}
+
+
+async def generate_batch(provider, prefix: str, batch: list,
+                         output_dir: Path, bucket=None) -> list:
+    """Generate several same-aspect variations in a single request (Google).
+
+    The shared theme/style prompt lists each variation's angle, and the
+    returned images are renamed to their variations' usual file names.
+
+    Returns:
+        (variation, result) pairs in batch order.
+    """
+    prompt = f"{prefix}. {len(batch)} separate images, one for each of: " + \
+        "; ".join(var["angle"] for var in batch)
+
+    if bucket:
+        await bucket.acquire()
+    result = await provider.agenerate(
+        prompt,
+        output_dir / f"moodboard_{batch[0]['index']:02d}.png",
+        count=len(batch),
+        aspect_ratio=batch[0]["aspect_ratio"]
+    )
+    if not result.success:
+        return [(var, {"success": False, "error": result.error, "prompt": var["prompt"]})
+                for var in batch]
+
+    results = []
+    files = iter(result.files)
+    for var in batch:
+        file = next(files, None)
+        if file is None:
+            results.append((var, {"success": False, "error": "No image returned", "prompt": var["prompt"]}))
+            continue
+        target = output_dir / f"moodboard_{var['index']:02d}{Path(file).suffix}"
+        os.replace(file, target)
+        results.append((var, {"success": True, "file": str(target), "prompt": var["prompt"]}))
+    return results
+
+
+def batch_variations(variations: list, size: int = GOOGLE_BATCH_SIZE) -> list:
+    """Group variations sharing an aspect ratio into chunks of at most size."""
+    groups = {}
+    for var in variations:
+        groups.setdefault(var["aspect_ratio"], []).append(var)
+    return [group[i:i + size] for group in groups.values()
+            for i in range(0, len(group), size)]
+
+
+def copy_duplicate(result: dict, var: dict, output_dir: Path) -> dict:
+    """Give a variation the image generated for an identical one.
+
+    The file is copied under the variation's own name rather than
+    hardlinked: outputs are rewritten in place (write_image, Pillow), so a
+    shared inode would let a later run into the same directory silently
+    change the twin.
+    """
+    if not result["success"]:
+        return {**result, "prompt": var["prompt"]}
+    source = Path(result["file"])
+    target = output_dir / f"moodboard_{var['index']:02d}{source.suffix}"
+    shutil.copyfile(source, target)
+    return {"success": True, "file": str(target), "prompt": var["prompt"]}
+
+
+class TokenBucket:
+    """Token bucket shared by coroutines to cap requests per minute.
+
+    Holds up to `capacity` tokens, refilled at `rpm` per minute; acquire()
+    waits until a token is available, so bursts stay within the limit.
+    """
+
+    def __init__(self, rpm: float, capacity: int):
+        self.rate = rpm / 60.0
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self._updated is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def is_retryable(error: str) -> bool:
+    """Whether a failed generation looks rate-limited or temporarily unavailable."""
+    error = (error or "").lower()
+    return any(marker in error for marker in RETRYABLE_ERRORS)
+
+
+async def generate_all(provider, variations: list, output_dir: Path,
+                       parallel: int, on_result, rpm: float = 0,
+                       cache: bool = False, batch_prefix: str = None,
+                       approx: bool = False, dedup: bool = True) -> None:
+    """Generate every variation concurrently, at most `parallel` at a time.
+
+    Requests are throttled to `rpm` per minute (0 = unlimited), and ones that
+    fail with a rate-limit or unavailable error are retried with exponential
+    backoff and jitter. With cache, variations generated before are reused,
+    and with approx also ones from earlier runs with the same angle and a
+    similar theme/style. With dedup, independently of cache, variations
+    repeating an earlier one's prompt and aspect ratio (more variations than
+    angles) get a copy of its image instead of being generated again.
+    With batch_prefix (the shared theme/style prompt), same-aspect variations
+    are requested together; see generate_batch(). on_result(var, result) is
+    called as each generation finishes.
+    """
+    semaphore = asyncio.Semaphore(max(parallel, 1))
+    bucket = TokenBucket(rpm, capacity=min(parallel, rpm)) if rpm > 0 else None
+
+    async def generate_job(job):
+        async with semaphore:
+            for attempt in range(MAX_RETRIES + 1):
+                if len(job) > 1:
+                    results = await generate_batch(provider, batch_prefix, job, output_dir, bucket)
+                else:
+                    var = job[0]
+                    output_path = output_dir / f"moodboard_{var['index']:02d}.png"
+                    approx_suffix = var["angle"] if approx else None
+                    results = [(var, await generate_image(provider, var["prompt"],
+                                                          var["aspect_ratio"], output_path,
+                                                          cache=cache, bucket=bucket,
+                                                          approx_suffix=approx_suffix))]
+                retry = any(not result["success"] and is_retryable(result["error"])
+                            for _, result in results)
+                if not retry or attempt == MAX_RETRIES:
+                    return results
+                await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    # Index of the first variation per (prompt, aspect) -> later ones repeating it
+    duplicates = {}
+    if dedup:
+        first_seen, unique = {}, []
+        for var in variations:
+            first = first_seen.setdefault((var["prompt"], var["aspect_ratio"]), var)
+            if first is var:
+                unique.append(var)
+            else:
+                duplicates.setdefault(first["index"], []).append(var)
+        variations = unique
 
-        except Exception as e:
-            return {"success": False, "error": str(e), "prompt": prompt}
+    jobs = batch_variations(variations) if batch_prefix else [[var] for var in variations]
+    for next_done in asyncio.as_completed([generate_job(job) for job in jobs]):
+        for var, result in await next_done:
+            on_result(var, result)
+            for duplicate in duplicates.get(var["index"], ()):
+                on_result(duplicate, copy_duplicate(result, duplicate, output_dir))
 
 
 def create_variation_prompts(theme: str, style: str, count: int,
                              use_aspects: bool = False) -> list:
     """Create diverse prompts for moodboard."""
-    prompts = []
-
     style_mod = STYLE_MODIFIERS.get(style, style) if style else ""
 
-    for i in range(count):
-        # Cycle through variation angles
-        angle = VARIATION_ANGLES[i % len(VARIATION_ANGLES)]
-
-        # Build prompt
-        parts = [theme]
-        if style_mod:
-            parts.append(style_mod)
-        parts.append(angle)
-
-        prompt = ", ".join(parts)
+    # Theme and style are shared; angles (and aspect ratios) cycle per image
+    prefix = ", ".join(part for part in (theme, style_mod) if part)
+    angles = itertools.cycle(VARIATION_ANGLES)
+    aspects = itertools.cycle(ASPECT_RATIOS) if use_aspects else itertools.repeat("1:1")
 
-        # Determine aspect ratio
-        if use_aspects:
-            aspect = ASPECT_RATIOS[i % len(ASPECT_RATIOS)]
-        else:
-            aspect = "1:1"
-
-        prompts.append({
-            "prompt": prompt,
+    return [
+        {
+            "prompt": f"{prefix}, {angle}",
             "aspect_ratio": aspect,
+            "angle": angle,
             "index": i + 1
-        })
-
-    return prompts
+        }
+        for i, angle, aspect in zip(range(count), angles, aspects)
+    ]
 
 
 def main():
     parser = argparse.ArgumentParser(description="Generate moodboard images")
-    parser.add_argument("--theme", "-t", required=True, help="Main theme/concept")
+    parser.add_argument("--theme", "-t", help="Main theme/concept (required)")
     parser.add_argument("--style", "-s", help="Artistic style",
                         choices=list(STYLE_MODIFIERS.keys()) + ["custom"])
     parser.add_argument("--custom-style", help="Custom style description")
@@ -178,7 +314,15 @@ def main():
     parser.add_argument("--model", "-m", help="Model to use")
     parser.add_argument("--output-dir", "-o", help="Output directory")
     parser.add_argument("--parallel", type=int, default=2,
-                        help="Parallel generation threads (default: 2)")
+                        help="Concurrent generations (default: 2)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Request up to 4 same-aspect variations per call (Google only)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always request new images instead of reusing cached ones")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Generate variations that repeat a prompt separately instead of copying")
+    parser.add_argument("--approx-cache", action="store_true",
+                        help="Also reuse cached images with similar prompts (Google only)")
     parser.add_argument("--list-styles", action="store_true",
                         help="List available styles")
     parser.add_argument("--json", action="store_true", help="Output as JSON")
@@ -191,6 +335,15 @@ def main():
         for name, desc in STYLE_MODIFIERS.items():
             print(f"  {name}: {desc}")
         return
+    if not args.theme:
+        parser.error("the following arguments are required: --theme/-t")
+
+    from datetime import datetime
+
+    from config import load_config, get_output_dir
+    from providers import get_provider
+    from providers.base import prune_cache
+    from utils import print_result, validate_api_key, json_dumps, print_json, emit_error
 
     # Load config
     config = load_config()
@@ -199,11 +352,7 @@ def main():
     # Validate API key
     valid, msg = validate_api_key(provider)
     if not valid:
-        if args.json:
-            print(json.dumps({"success": False, "error": msg}))
-        else:
-            print_result(False, msg)
-        sys.exit(1)
+        emit_error(msg, args.json)
 
     # Get model
     provider_config = config.get(provider, {})
@@ -215,11 +364,11 @@ def main():
     style = args.custom_style if args.style == "custom" else args.style
 
     # Setup output directory
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     if args.output_dir:
         output_dir = Path(args.output_dir)
     else:
         # Create themed directory
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         theme_slug = args.theme.lower().replace(" ", "_")[:30]
         output_dir = get_output_dir() / "moodboards" / f"{theme_slug}_{timestamp}"
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -249,58 +398,68 @@ def main():
         "errors": []
     }
 
-    # Generate images in parallel
-    def generate_variation(var):
-        output_path = output_dir / f"moodboard_{var['index']:02d}.png"
-        return generate_image(
-            prompt=var["prompt"],
-            provider=provider,
-            model=model,
-            aspect_ratio=var["aspect_ratio"],
-            output_path=output_path
-        )
-
-    with ThreadPoolExecutor(max_workers=args.parallel) as executor:
-        futures = {executor.submit(generate_variation, v): v for v in variations}
-
-        for future in as_completed(futures):
-            var = futures[future]
-            result = future.result()
-
-            if result["success"]:
-                results["files"].append({
-                    "file": result["file"],
-                    "prompt": result["prompt"],
-                    "index": var["index"]
-                })
-                if not args.json:
+    # With --batch, Gemini variations share the theme/style part of the prompt
+    batch_prefix = None
+    if args.batch and provider == "google":
+        batch_prefix = ", ".join(filter(None, [args.theme, STYLE_MODIFIERS.get(style, style)]))
+
+    # Generate images concurrently
+    def record(var, result):
+        if result["success"]:
+            entry = {
+                "file": result["file"],
+                "prompt": result["prompt"],
+                "index": var["index"]
+            }
+            if "similar_to" in result:
+                entry["similar_to"] = result["similar_to"]
+            results["files"].append(entry)
+            if not args.json:
+                if "similar_to" in result:
+                    print(f"[{var['index']}/{len(variations)}] Reused: {result['file']} "
+                          f"(cached for \"{result['similar_to']}\")")
+                else:
                     print(f"[{var['index']}/{len(variations)}] Generated: {result['file']}")
-            else:
-                results["errors"].append({
-                    "index": var["index"],
-                    "error": result["error"]
-                })
-                if not args.json:
-                    print(f"[{var['index']}/{len(variations)}] Failed: {result['error']}")
+        else:
+            results["errors"].append({
+                "index": var["index"],
+                "error": result["error"]
+            })
+            if not args.json:
+                print(f"[{var['index']}/{len(variations)}] Failed: {result['error']}")
+
+    asyncio.run(generate_all(
+        get_provider(provider, model=model),
+        variations,
+        output_dir,
+        args.parallel,
+        record,
+        rpm=provider_config.get("rpm", 0),
+        cache=not args.no_cache,
+        batch_prefix=batch_prefix,
+        approx=args.approx_cache and not args.no_cache,
+        dedup=not args.no_dedup
+    ))
+    if not args.no_cache:
+        prune_cache()
 
     # Save metadata
     meta_file = output_dir / "moodboard_meta.json"
-    with open(meta_file, "w") as f:
-        json.dump({
-            "theme": args.theme,
-            "style": style,
-            "provider": provider,
-            "model": model,
-            "variations": variations,
-            "files": [f["file"] for f in results["files"]]
-        }, f, indent=2)
+    meta_file.write_bytes(json_dumps({
+        "theme": args.theme,
+        "style": style,
+        "provider": provider,
+        "model": model,
+        "variations": variations,
+        "files": [f["file"] for f in results["files"]]
+    }))
 
     results["success"] = len(results["files"]) > 0
     results["metadata_file"] = str(meta_file)
 
     # Output results
     if args.json:
-        print(json.dumps(results, indent=2))
+        print_json(results)
     else:
         print()
         if results["success"]:
@@ -11,34 +11,63 @@ Usage:
     result = provider.generate("A sunset over mountains", output_path=Path("image.png"))
 """
 
+import importlib
+
 from .base import ImageProvider, ProviderResult
-from .google import GoogleProvider
-from .openai import OpenAIProvider
 
-# Provider registry
+# Provider registry: name -> (module, class name). Provider modules are only
+# imported when first used, so commands that never call a provider (such as
+# listing sessions) don't pay for them.
 _PROVIDERS = {
-    "google": GoogleProvider,
-    "openai": OpenAIProvider,
+    "google": (".google", "GoogleProvider"),
+    "openai": (".openai", "OpenAIProvider"),
 }
 
+# Provider classes by class name, for the lazy module attributes below
+_CLASS_MODULES = {class_name: module for module, class_name in _PROVIDERS.values()}
+
+# Provider instances by (name, constructor kwargs); one instance per
+# configuration serves the process, along with the state it keeps
+_INSTANCES = {}
+
+
+def _load_provider_class(module: str, class_name: str) -> type:
+    """Import a provider module and return its provider class."""
+    return getattr(importlib.import_module(module, __name__), class_name)
+
+
+def __getattr__(name: str):
+    """Resolve GoogleProvider / OpenAIProvider on first access."""
+    if name in _CLASS_MODULES:
+        return _load_provider_class(_CLASS_MODULES[name], name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_provider(name: str, **kwargs) -> ImageProvider:
-    """Get a provider instance by name.
+    """Get the shared provider instance for a name and configuration.
+
+    The instance is shared by every caller in the process, including the
+    cache keys it has stored; similar_cached_result() skips those, so images
+    stored earlier in the process are not reused as approximate matches.
 
     Args:
         name: Provider name ("google" or "openai").
         **kwargs: Additional arguments passed to provider constructor.
 
     Returns:
-        Provider instance.
+        Provider instance, created on the first call with these arguments.
 
     Raises:
         ValueError: If provider name is unknown.
     """
-    provider_class = _PROVIDERS.get(name.lower())
-    if not provider_class:
-        raise ValueError(f"Unknown provider: {name}. Supported: {list(_PROVIDERS.keys())}")
-    return provider_class(**kwargs)
+    key = (name.lower(), tuple(sorted(kwargs.items())))
+    provider = _INSTANCES.get(key)
+    if provider is None:
+        entry = _PROVIDERS.get(key[0])
+        if not entry:
+            raise ValueError(f"Unknown provider: {name}. Supported: {list(_PROVIDERS.keys())}")
+        provider = _INSTANCES[key] = _load_provider_class(*entry)(**kwargs)
+    return provider
 
 
 def list_providers() -> list:
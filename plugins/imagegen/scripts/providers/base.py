@@ -3,10 +3,111 @@
 Base class for image generation providers.
 """
 
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import sys
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
+
+# Add parent directory for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import ensure_dir, json_dumps, json_loads, write_image
+
+# SDK clients keyed by (provider name, API key), shared across provider
+# instances so repeated calls reuse their HTTP connection pools
+_CLIENTS: Dict[tuple, Any] = {}
+
+
+def get_cache_dir() -> Path:
+    """Directory holding cached generations, keyed by request hash."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "claude-imagegen"
+
+
+# One JSON line per cached image (key, provider, model, prompt, params),
+# searched by ImageProvider.similar_cached_result()
+PROMPT_INDEX_NAME = "prompts.jsonl"
+
+# Minimum prompt similarity for similar_cached_result() to reuse an image
+SIMILARITY_THRESHOLD = 0.65
+
+# prune_cache() limits: images unused for longer than this are removed, then
+# the least recently used ones until the cache fits in the size cap
+CACHE_MAX_AGE_DAYS = 30
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def prompt_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of two prompts' lowercase word sets (0 to 1)."""
+    words_a = set(_WORD_RE.findall(a.lower()))
+    words_b = set(_WORD_RE.findall(b.lower()))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def prune_cache(max_age_days: float = CACHE_MAX_AGE_DAYS,
+                max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """Evict cached images by recency and total size, and drop their prompts.
+
+    Cache hits refresh an image's mtime, so age is time since last use.
+    Best effort: errors leave the cache as it was. A record appended by a
+    concurrent run while the prompt index is rewritten may be lost, which
+    only hides that image from similar_cached_result().
+    """
+    cache_dir = get_cache_dir()
+    images = []
+    try:
+        for folder in cache_dir.iterdir():
+            if folder.is_dir():
+                for image in folder.iterdir():
+                    if not image.name.startswith("."):
+                        stat = image.stat()
+                        images.append((stat.st_mtime, stat.st_size, image))
+    except OSError:
+        return
+
+    # Oldest first; drop expired images, then the oldest until under the cap
+    images.sort()
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in images)
+    removed = set()
+    for mtime, size, image in images:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            image.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed.add(image.stem)
+    if not removed:
+        return
+
+    index = cache_dir / PROMPT_INDEX_NAME
+    tmp = cache_dir / f".{PROMPT_INDEX_NAME}.{os.getpid()}.tmp"
+    try:
+        lines = index.read_bytes().splitlines()
+        kept = []
+        for line in lines:
+            try:
+                if json_loads(line)["key"] not in removed:
+                    kept.append(line + b"\n")
+            except (ValueError, KeyError, TypeError):
+                continue  # torn or malformed records are dropped too
+        tmp.write_bytes(b"".join(kept))
+        os.replace(tmp, index)
+    except OSError:
+        tmp.unlink(missing_ok=True)
 
 
 @dataclass
@@ -51,6 +152,10 @@ class ImageProvider(ABC):
             model: Model to use (default: provider-specific default).
         """
         self._model = model
+        # Cache keys stored by this instance, which similar_cached_result()
+        # skips so images from the current run aren't reused for each other.
+        # get_provider() shares instances, so this spans the whole process
+        self._stored_keys = set()
 
     @property
     def name(self) -> str:
@@ -98,6 +203,29 @@ class ImageProvider(ABC):
         """
         pass
 
+    async def agenerate(
+        self,
+        prompt: str,
+        output_path: Path,
+        count: int = 1,
+        **kwargs
+    ) -> ProviderResult:
+        """Generate image(s) without blocking the event loop.
+
+        Runs generate() on a worker thread; providers whose SDK has a
+        native async client override this.
+
+        Args:
+            prompt: Text prompt describing the image.
+            output_path: Path to save the generated image.
+            count: Number of images to generate.
+            **kwargs: Provider-specific options.
+
+        Returns:
+            ProviderResult with generated file paths or error.
+        """
+        return await asyncio.to_thread(self.generate, prompt, output_path, count=count, **kwargs)
+
     @abstractmethod
     def edit(
         self,
@@ -154,16 +282,200 @@ class ImageProvider(ABC):
             f"{self.name} provider doesn't support multi-turn iteration"
         )
 
+    def _cached_client(self, api_key: Optional[str], factory: Callable[[], Any]) -> Any:
+        """Get the shared SDK client for this provider and API key.
+
+        Args:
+            api_key: API key the client is bound to.
+            factory: Builds a new client on a cache miss.
+
+        Returns:
+            The cached client.
+        """
+        key = (self.name, api_key)
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = factory()
+        return client
+
+    def _cache_key(self, prompt: str, **params) -> str:
+        """Hash a generation request into a cache key.
+
+        Args:
+            prompt: Text prompt.
+            **params: Request options that affect the output (aspect ratio etc).
+
+        Returns:
+            Hex SHA-256 of provider, model, prompt and params.
+        """
+        parts = [self.name, self.model, prompt]
+        parts.extend(f"{k}={params[k]}" for k in sorted(params))
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _cache_lookup(self, key: str) -> Optional[Path]:
+        """Find the cached image for a key, if any."""
+        folder = get_cache_dir() / key[:2]
+        try:
+            return next(folder.glob(f"{key}.*"), None)
+        except OSError:
+            return None
+
+    def _cache_store(self, filepath: Path, prompt: str, **params) -> None:
+        """Copy a generated image into the cache and index its prompt.
+
+        Best effort: a failure here never fails the generation.
+
+        Args:
+            filepath: Generated image.
+            prompt: Text prompt it was generated from.
+            **params: Request options included in the cache key.
+        """
+        key = self._cache_key(prompt, **params)
+        cache_dir = get_cache_dir()
+        folder = cache_dir / key[:2]
+        tmp = folder / f".{key}.{os.getpid()}.tmp"
+        try:
+            ensure_dir(folder)
+            shutil.copyfile(filepath, tmp)
+            # Atomic, so concurrent runs never see a partial image
+            os.replace(tmp, folder / f"{key}{filepath.suffix}")
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+        self._stored_keys.add(key)
+
+        record = {"key": key, "provider": self.name, "model": self.model,
+                  "prompt": prompt, "params": params}
+        try:
+            # One O_APPEND write per record, so concurrent runs don't interleave
+            fd = os.open(cache_dir / PROMPT_INDEX_NAME, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+            try:
+                os.write(fd, json_dumps(record, indent=False) + b"\n")
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def _from_cache(self, key: str, output_path: Path) -> Optional[Path]:
+        """Copy the cached image for a key to output_path.
+
+        The suffix follows the cached image's format, as _save_image_data does.
+
+        Returns:
+            Path written, or None on a cache miss.
+        """
+        cached = self._cache_lookup(key)
+        if cached is None:
+            return None
+        filepath = output_path.with_suffix(cached.suffix)
+        ensure_dir(filepath.parent)
+        try:
+            shutil.copyfile(cached, filepath)
+            # Mark it recently used for prune_cache()
+            os.utime(cached)
+        except OSError:
+            return None
+        return filepath
+
+    def cached_result(
+        self,
+        prompt: str,
+        output_path: Path,
+        **params
+    ) -> Optional[ProviderResult]:
+        """Reuse an earlier identical single-image generation, if cached.
+
+        Args:
+            prompt: Text prompt.
+            output_path: Where to copy the cached image.
+            **params: Request options included in the cache key.
+
+        Returns:
+            Success result marked cached=True, or None on a cache miss.
+        """
+        filepath = self._from_cache(self._cache_key(prompt, **params), output_path)
+        if filepath is None:
+            return None
+        return self._success([str(filepath)], prompt, cached=True)
+
+    def similar_cached_result(
+        self,
+        prompt: str,
+        output_path: Path,
+        threshold: float = SIMILARITY_THRESHOLD,
+        suffix: Optional[str] = None,
+        **params
+    ) -> Optional[ProviderResult]:
+        """Reuse the cached image whose prompt is most like this one.
+
+        Only images from the same provider, model and params are candidates,
+        excluding ones this instance cached itself, and the best must reach
+        threshold (see prompt_similarity()). With a suffix (e.g. a moodboard
+        variation's angle), candidates must end with the same suffix and
+        only the rest of the prompts is compared.
+
+        Args:
+            prompt: Text prompt.
+            output_path: Where to copy the cached image.
+            threshold: Minimum similarity to accept.
+            suffix: Trailing part of prompt that must match exactly.
+            **params: Request options that must match exactly.
+
+        Returns:
+            Success result marked cached=True with similar_to and similarity,
+            or None when nothing is similar enough.
+        """
+        try:
+            lines = (get_cache_dir() / PROMPT_INDEX_NAME).read_bytes().splitlines()
+        except OSError:
+            return None
+
+        # Latest record per key; older duplicates come from re-caching
+        candidates = {}
+        for line in lines:
+            try:
+                record = json_loads(line)
+            except ValueError:
+                continue  # a torn line from an interrupted write
+            if (record.get("provider") == self.name and record.get("model") == self.model
+                    and record.get("params") == params
+                    and record.get("key") not in self._stored_keys):
+                candidates[record["key"]] = record["prompt"]
+
+        def compared(text: str) -> Optional[str]:
+            """The part of a prompt that is scored, or None if the suffix differs."""
+            if not suffix:
+                return text
+            return text[:-len(suffix)] if text.endswith(suffix) else None
+
+        head = compared(prompt)
+        if head is None:
+            return None
+        scored = sorted(
+            ((prompt_similarity(head, compared(other)), key, other)
+             for key, other in candidates.items() if compared(other) is not None),
+            reverse=True
+        )
+        for similarity, key, other in scored:
+            if similarity < threshold:
+                break
+            # Skip records whose image has since been removed from the cache
+            filepath = self._from_cache(key, output_path)
+            if filepath is not None:
+                return self._success([str(filepath)], prompt, cached=True,
+                                     similar_to=other, similarity=round(similarity, 3))
+        return None
+
     def _save_image_data(
         self,
-        data: bytes,
+        data: Union[bytes, str],
         output_path: Path,
         mime_type: str = "image/png"
     ) -> Path:
         """Save binary image data to file.
 
         Args:
-            data: Image bytes.
+            data: Image bytes, or base64 text as some SDK responses return.
             output_path: Target path.
             mime_type: MIME type for extension detection.
 
@@ -175,12 +487,9 @@ class ImageProvider(ABC):
         filepath = output_path.with_suffix(f".{ext}")
 
         # Ensure directory exists
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(filepath, "wb") as f:
-            f.write(data)
+        ensure_dir(filepath.parent)
 
-        return filepath
+        return write_image(data, filepath)
 
     def _error(self, message: str) -> ProviderResult:
         """Create an error result.
@@ -3,8 +3,11 @@
 Google Gemini image generation provider.
 """
 
-import os
+import asyncio
+import functools
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -12,6 +15,86 @@ from typing import Optional
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from .base import ImageProvider, ProviderResult
+from utils import env_api_key, get_image_mime_type
+
+# (genai, types) once imported; see _genai()
+_GENAI = None
+
+
+def _genai():
+    """Import the google-genai SDK on first use and cache the modules."""
+    global _GENAI
+    if _GENAI is None:
+        try:
+            from google import genai
+            from google.genai import types
+        except ImportError:
+            raise ImportError(
+                "google-genai package not installed. Run: pip install google-genai"
+            )
+        _GENAI = (genai, types)
+    return _GENAI
+
+
+# Batch job states that end polling
+_BATCH_DONE_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+
+
+@functools.lru_cache(maxsize=32)
+def _image_config(aspect_ratio: Optional[str] = None, number_of_images: int = 1):
+    """Build (once per combination) the GenerateContentConfig for image output."""
+    _, types = _genai()
+    config = types.GenerateContentConfig(
+        response_modalities=["IMAGE"],
+    )
+
+    # Configure image-specific settings including count
+    image_config_params = {}
+    if aspect_ratio:
+        image_config_params["aspect_ratio"] = aspect_ratio
+    if number_of_images > 1:
+        image_config_params["number_of_images"] = number_of_images
+
+    if image_config_params:
+        config.image_config = types.ImageConfig(**image_config_params)
+    return config
+
+
+# Maximum session history images read from disk at once
+MAX_READ_WORKERS = 8
+
+
+def _read_if_exists(path: Optional[Path]) -> Optional[bytes]:
+    """Read a file's bytes, or None when there is no path or the file is gone."""
+    if path is None:
+        return None
+    # One open instead of a stat plus an open; history files are normally there
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _iter_image_parts(response):
+    """Yield the inline image blobs in a response, skipping text parts.
+
+    response.parts is None when the response has no candidates (e.g. the
+    prompt was blocked), which yields nothing.
+    """
+    for part in response.parts or ():
+        inline_data = getattr(part, "inline_data", None)
+        if inline_data:
+            yield inline_data
+
+
+def _first_inline_data(response):
+    """Get the first inline image blob in a response, or None."""
+    return next(_iter_image_parts(response), None)
 
 
 class GoogleProvider(ImageProvider):
@@ -23,17 +106,13 @@ class GoogleProvider(ImageProvider):
 
     def _get_api_key(self) -> Optional[str]:
         """Get Google API key from environment."""
-        return os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
+        return env_api_key("google")
 
     def _get_client(self):
         """Get Google GenAI client."""
-        try:
-            from google import genai
-            return genai.Client(api_key=self._get_api_key())
-        except ImportError:
-            raise ImportError(
-                "google-genai package not installed. Run: pip install google-genai"
-            )
+        genai, _ = _genai()
+        api_key = self._get_api_key()
+        return self._cached_client(api_key, lambda: genai.Client(api_key=api_key))
 
     def validate_config(self) -> ProviderResult:
         """Validate Google API configuration."""
@@ -49,6 +128,7 @@ class GoogleProvider(ImageProvider):
         output_path: Path,
         count: int = 1,
         aspect_ratio: str = "1:1",
+        cache: bool = False,
         **kwargs
     ) -> ProviderResult:
         """Generate image(s) with Google Gemini.
@@ -58,6 +138,8 @@ class GoogleProvider(ImageProvider):
             output_path: Output file path.
             count: Number of images (max 4).
             aspect_ratio: Aspect ratio (e.g., "1:1", "16:9").
+            cache: Reuse an earlier identical single-image generation, and
+                cache this one (see get_cache_dir()).
 
         Returns:
             ProviderResult with generated files.
@@ -66,55 +148,204 @@ class GoogleProvider(ImageProvider):
         if not validation.success:
             return validation
 
-        try:
-            from google.genai import types
+        cache_params = None
+        if cache and count == 1:
+            cache_params = {"aspect_ratio": aspect_ratio}
+            cached = self.cached_result(prompt, output_path, **cache_params)
+            if cached:
+                return cached
 
+        try:
             client = self._get_client()
 
-            # Configure generation
-            config = types.GenerateContentConfig(
-                response_modalities=["IMAGE"],
+            # Configure generation (max 4 images)
+            config = _image_config(aspect_ratio, min(count, 4))
+
+            response = client.models.generate_content(
+                model=self.model,
+                contents=[prompt],
+                config=config
             )
+            return self._save_generated(response, prompt, output_path, count, cache_params)
 
-            # Configure image-specific settings including count
-            image_config_params = {}
-            if aspect_ratio:
-                image_config_params["aspect_ratio"] = aspect_ratio
-            if count > 1:
-                image_config_params["number_of_images"] = min(count, 4)  # Max 4 images
+        except ImportError as e:
+            return self._error(str(e))
+        except OSError as e:
+            return self._error(f"File I/O error: {e}")
+        except Exception as e:
+            return self._error(f"{type(e).__name__}: {e}")
 
-            if image_config_params:
-                config.image_config = types.ImageConfig(**image_config_params)
+    async def agenerate(
+        self,
+        prompt: str,
+        output_path: Path,
+        count: int = 1,
+        aspect_ratio: str = "1:1",
+        cache: bool = False,
+        **kwargs
+    ) -> ProviderResult:
+        """Generate image(s) through the SDK's native async client.
 
-            response = client.models.generate_content(
+        Same arguments and result as generate(); the request runs on the
+        event loop via client.aio instead of a worker thread, and the cache
+        and image files are read and written on worker threads so other
+        requests keep going meanwhile.
+        """
+        validation = self.validate_config()
+        if not validation.success:
+            return validation
+
+        cache_params = None
+        if cache and count == 1:
+            cache_params = {"aspect_ratio": aspect_ratio}
+            cached = await asyncio.to_thread(
+                self.cached_result, prompt, output_path, **cache_params
+            )
+            if cached:
+                return cached
+
+        try:
+            client = self._get_client()
+
+            response = await client.aio.models.generate_content(
                 model=self.model,
                 contents=[prompt],
-                config=config
+                config=_image_config(aspect_ratio, min(count, 4))
+            )
+            return await asyncio.to_thread(
+                self._save_generated, response, prompt, output_path, count, cache_params
             )
 
-            # Extract and save images
-            saved_files = []
-            for i, part in enumerate(response.parts):
-                if hasattr(part, "inline_data") and part.inline_data:
-                    mime = getattr(part.inline_data, "mime_type", "image/png")
-
-                    # Generate filename for multiple images
-                    if count > 1 or i > 0:
-                        filepath = output_path.parent / f"{output_path.stem}_{i+1}.{mime.split('/')[-1]}"
-                    else:
-                        filepath = output_path
-
-                    actual_path = self._save_image_data(
-                        part.inline_data.data,
-                        filepath,
-                        mime
+        except ImportError as e:
+            return self._error(str(e))
+        except OSError as e:
+            return self._error(f"File I/O error: {e}")
+        except Exception as e:
+            return self._error(f"{type(e).__name__}: {e}")
+
+    def _save_generated(
+        self,
+        response,
+        prompt: str,
+        output_path: Path,
+        count: int,
+        cache_params: Optional[dict] = None
+    ) -> ProviderResult:
+        """Save the images in a generate_content response and build the result.
+
+        With cache_params, the saved image is also stored in the cache.
+        """
+        # Extract images
+        parent, stem = output_path.parent, output_path.stem
+        pending = []
+        for i, inline_data in enumerate(_iter_image_parts(response)):
+            mime = getattr(inline_data, "mime_type", "image/png")
+
+            # Generate filename for multiple images
+            if count > 1 or i > 0:
+                filepath = parent / f"{stem}_{i+1}.{mime.split('/')[-1]}"
+            else:
+                filepath = output_path
+
+            pending.append((inline_data.data, filepath, mime))
+
+        # Save them, overlapping the writes when there are several
+        if len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(pending), 4)) as executor:
+                actual_paths = list(executor.map(lambda item: self._save_image_data(*item), pending))
+        else:
+            actual_paths = [self._save_image_data(*item) for item in pending]
+        saved_files = [str(path) for path in actual_paths]
+
+        if saved_files:
+            if cache_params is not None:
+                self._cache_store(actual_paths[0], prompt, **cache_params)
+            return self._success(saved_files, prompt)
+        else:
+            return self._error("No images returned from API")
+
+    def generate_batch(
+        self,
+        prompt: str,
+        output_path: Path,
+        count: int,
+        aspect_ratio: str = "1:1",
+        poll_interval: float = 5.0,
+        max_poll_interval: float = 60.0,
+        timeout: float = 3600.0,
+        **kwargs
+    ) -> ProviderResult:
+        """Generate many images through the Gemini Batch API.
+
+        Batch jobs are billed at a discount but run asynchronously, so this
+        polls with exponential backoff until the job finishes. Small counts
+        are faster through generate().
+
+        Args:
+            prompt: Image prompt.
+            output_path: Output file path (images are numbered _1, _2, ...).
+            count: Number of images; one batch request per image.
+            aspect_ratio: Aspect ratio (e.g., "1:1", "16:9").
+            poll_interval: Initial seconds between job status checks.
+            max_poll_interval: Upper bound for the backoff delay.
+            timeout: Seconds to wait before giving up on the job.
+
+        Returns:
+            ProviderResult with generated files.
+        """
+        validation = self.validate_config()
+        if not validation.success:
+            return validation
+
+        try:
+            client = self._get_client()
+
+            config = {"response_modalities": ["IMAGE"]}
+            if aspect_ratio:
+                config["image_config"] = {"aspect_ratio": aspect_ratio}
+            request = {
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "config": config
+            }
+
+            job = client.batches.create(
+                model=self.model,
+                src=[request] * count,
+                config={"display_name": f"imagegen-{output_path.stem}"}
+            )
+
+            deadline = time.monotonic() + timeout
+            delay = poll_interval
+            while job.state.name not in _BATCH_DONE_STATES:
+                if time.monotonic() >= deadline:
+                    return self._error(
+                        f"Batch job {job.name} still running after {timeout:.0f}s"
                     )
-                    saved_files.append(str(actual_path))
+                time.sleep(delay)
+                delay = min(delay * 2, max_poll_interval)
+                job = client.batches.get(name=job.name)
+
+            if job.state.name != "JOB_STATE_SUCCEEDED":
+                return self._error(f"Batch job {job.name} ended with {job.state.name}")
+
+            # Extract and save images, numbered by request order
+            parent, stem = output_path.parent, output_path.stem
+            saved_files = []
+            for i, inlined in enumerate(job.dest.inlined_responses):
+                if getattr(inlined, "error", None) or not inlined.response:
+                    continue
+                inline = _first_inline_data(inlined.response)
+                if inline is None:
+                    continue
+                mime = getattr(inline, "mime_type", "image/png")
+                filepath = parent / f"{stem}_{i+1}.{mime.split('/')[-1]}"
+                actual_path = self._save_image_data(inline.data, filepath, mime)
+                saved_files.append(str(actual_path))
 
             if saved_files:
-                return self._success(saved_files, prompt)
+                return self._success(saved_files, prompt, batch_job=job.name)
             else:
-                return self._error("No images returned from API")
+                return self._error("No images returned from batch job")
 
         except ImportError as e:
             return self._error(str(e))
@@ -150,24 +381,15 @@ class GoogleProvider(ImageProvider):
             return self._error(f"Source image not found: {image_path}")
 
         try:
-            from google.genai import types
+            _, types = _genai()
 
-            client = self._get_client()
+            # Load source image while the client is being set up
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                image_future = executor.submit(image_path.read_bytes)
+                client = self._get_client()
+                image_data = image_future.result()
 
-            # Load source image
-            with open(image_path, "rb") as f:
-                image_data = f.read()
-
-            # Detect mime type
-            ext = image_path.suffix.lower()
-            mime_types = {
-                ".png": "image/png",
-                ".jpg": "image/jpeg",
-                ".jpeg": "image/jpeg",
-                ".webp": "image/webp",
-                ".gif": "image/gif"
-            }
-            mime_type = mime_types.get(ext, "image/png")
+            mime_type = get_image_mime_type(image_path)
 
             # Create image part
             image_part = types.Part(
@@ -178,9 +400,7 @@ class GoogleProvider(ImageProvider):
             )
 
             # Configure for image output
-            config = types.GenerateContentConfig(
-                response_modalities=["IMAGE"],
-            )
+            config = _image_config()
 
             # Send image + prompt
             response = client.models.generate_content(
@@ -190,21 +410,20 @@ class GoogleProvider(ImageProvider):
             )
 
             # Extract result
-            for part in response.parts:
-                if hasattr(part, "inline_data") and part.inline_data:
-                    mime = getattr(part.inline_data, "mime_type", "image/png")
-                    actual_path = self._save_image_data(
-                        part.inline_data.data,
-                        output_path,
-                        mime
-                    )
-                    return self._success(
-                        [str(actual_path)],
-                        prompt,
-                        original=str(image_path)
-                    )
-
-            return self._error("No edited image returned from API")
+            inline = _first_inline_data(response)
+            if inline is None:
+                return self._error("No edited image returned from API")
+
+            actual_path = self._save_image_data(
+                inline.data,
+                output_path,
+                getattr(inline, "mime_type", "image/png")
+            )
+            return self._success(
+                [str(actual_path)],
+                prompt,
+                original=str(image_path)
+            )
 
         except ImportError as e:
             return self._error(str(e))
@@ -222,6 +441,7 @@ class GoogleProvider(ImageProvider):
         session: dict,
         prompt: str,
         output_path: Path,
+        history_turns: int = 3,
         **kwargs
     ) -> ProviderResult:
         """Perform iteration step with conversation history.
@@ -230,6 +450,8 @@ class GoogleProvider(ImageProvider):
             session: Session with history of images/prompts.
             prompt: New refinement instructions.
             output_path: Output path for new image.
+            history_turns: Most recent history steps to send as context,
+                so request size stays flat as the session grows (0 = all).
 
         Returns:
             ProviderResult with new image.
@@ -239,37 +461,36 @@ class GoogleProvider(ImageProvider):
             return validation
 
         try:
-            from google.genai import types
-
-            client = self._get_client()
+            _, types = _genai()
+
+            # Build conversation history from the most recent steps
+            history = session.get("history", [])
+            if history_turns > 0:
+                history = history[-history_turns:]
+            image_paths = [
+                Path(entry["image"]) if entry.get("image") else None
+                for entry in history
+            ]
+
+            # Read the history images concurrently while the client is set up
+            workers = min(len(image_paths), MAX_READ_WORKERS) or 1
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                images = executor.map(_read_if_exists, image_paths)
+                client = self._get_client()
+                images = list(images)
 
-            # Build conversation history
             contents = []
 
-            for entry in session.get("history", []):
-                if entry.get("image"):
-                    image_path = Path(entry["image"])
-                    if image_path.exists():
-                        with open(image_path, "rb") as f:
-                            image_data = f.read()
-
-                        # Detect mime type
-                        ext = image_path.suffix.lower()
-                        mime_types = {
-                            ".png": "image/png",
-                            ".jpg": "image/jpeg",
-                            ".jpeg": "image/jpeg",
-                            ".webp": "image/webp",
-                            ".gif": "image/gif"
-                        }
-                        mime_type = mime_types.get(ext, "image/png")
-
-                        contents.append(types.Part(
-                            inline_data=types.Blob(
-                                mime_type=mime_type,
-                                data=image_data
-                            )
-                        ))
+            for entry, image_path, image_data in zip(history, image_paths, images):
+                if image_data is not None:
+                    mime_type = get_image_mime_type(image_path)
+
+                    contents.append(types.Part(
+                        inline_data=types.Blob(
+                            mime_type=mime_type,
+                            data=image_data
+                        )
+                    ))
 
                 if entry.get("prompt"):
                     contents.append(entry["prompt"])
@@ -278,9 +499,7 @@ class GoogleProvider(ImageProvider):
             contents.append(prompt)
 
             # Configure for image output
-            config = types.GenerateContentConfig(
-                response_modalities=["IMAGE"],
-            )
+            config = _image_config()
 
             response = client.models.generate_content(
                 model=self.model,
@@ -289,22 +508,21 @@ class GoogleProvider(ImageProvider):
             )
 
             # Extract result
-            for part in response.parts:
-                if hasattr(part, "inline_data") and part.inline_data:
-                    mime = getattr(part.inline_data, "mime_type", "image/png")
-                    actual_path = self._save_image_data(
-                        part.inline_data.data,
-                        output_path,
-                        mime
-                    )
-                    return self._success(
-                        [str(actual_path)],
-                        prompt,
-                        session_id=session.get("id"),
-                        step=len(session.get("history", [])) + 1
-                    )
-
-            return self._error("No image returned from iteration")
+            inline = _first_inline_data(response)
+            if inline is None:
+                return self._error("No image returned from iteration")
+
+            actual_path = self._save_image_data(
+                inline.data,
+                output_path,
+                getattr(inline, "mime_type", "image/png")
+            )
+            return self._success(
+                [str(actual_path)],
+                prompt,
+                session_id=session.get("id"),
+                step=len(session.get("history", [])) + 1
+            )
 
         except ImportError as e:
             return self._error(str(e))
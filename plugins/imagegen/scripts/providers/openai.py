@@ -3,11 +3,12 @@
 OpenAI GPT-Image generation provider.
 """
 
-import base64
-import os
+import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 # Add parent and shared directories for imports
 SCRIPT_DIR = Path(__file__).parent.parent
@@ -16,54 +17,118 @@ sys.path.insert(0, str(SCRIPT_DIR))
 sys.path.insert(0, str(REPO_ROOT))
 
 from .base import ImageProvider, ProviderResult
+from utils import ensure_dir, env_api_key, get_image_mime_type, write_image
+
+# Read size for streaming URL downloads to disk; large reads cut the
+# read/write syscall count per image (kept modest on Windows)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024 if sys.platform == "win32" else 1024 * 1024
+
+# Maximum URL results downloaded at once
+MAX_DOWNLOAD_WORKERS = 8
+
+# httpx is optional; when installed, URL downloads share one pooled client
+# (HTTP/2 if the h2 extra is present) instead of a new connection per image
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# User-Agent sent with URL downloads
+USER_AGENT = 'claude-code-plugins/1.0'
+
+# Maximum base64 results decoded and written at once
+MAX_WRITE_WORKERS = 4
+
+# Edit inputs up to this size are read once and uploaded from memory;
+# larger ones are streamed from an open file
+INLINE_UPLOAD_MAX = 4 * 1024 * 1024
+
+# OpenAI client class once imported; see _openai()
+_OPENAI = None
+
+
+def _openai():
+    """Import the OpenAI SDK on first use and cache the client class."""
+    global _OPENAI
+    if _OPENAI is None:
+        try:
+            from openai import OpenAI
+        except ImportError:
+            raise ImportError(
+                "openai package not installed. Run: pip install openai"
+            )
+        _OPENAI = OpenAI
+    return _OPENAI
+
+
+def _upload_file(path: Path, stack: ExitStack):
+    """Prepare an image for upload to the edits endpoint.
+
+    Small files become a (name, bytes, mime type) tuple so the SDK neither
+    re-reads nor guesses the content type; large ones are opened on stack
+    and streamed.
+    """
+    if path.stat().st_size <= INLINE_UPLOAD_MAX:
+        return (path.name, path.read_bytes(), get_image_mime_type(path))
+    return stack.enter_context(open(path, "rb"))
+
 
 # Import SSRF protection from shared (with fallback)
 try:
     from shared.security import is_safe_url
 except ImportError:
     # Fallback if shared not available - comprehensive private IP rejection
+    def _host_safe(host: str) -> bool:
+        """Check a lowercased hostname against SSRF rules.
+
+        Not cached: the DNS answer must be re-checked on every call, or a
+        rebound record would keep its first verdict past its TTL.
+        """
+        import ipaddress
+        import socket
+
+        # Block common dangerous hostnames
+        dangerous_hosts = {
+            'localhost', '127.0.0.1', '::1',
+            '169.254.169.254',  # AWS metadata
+            'metadata.google.internal',  # GCP metadata
+            '100.100.100.200',  # Alibaba metadata
+        }
+        if host in dangerous_hosts:
+            return False
+
+        # Try to resolve and check if it's a private IP
+        try:
+            # Resolve hostname to IP.
+            # NOTE: TOCTOU — DNS may resolve differently between this check
+            # and the actual connection (DNS rebinding). A full fix requires
+            # binding the resolved IP directly; left as a known limitation.
+            ip_str = socket.gethostbyname(host)
+            ip = ipaddress.ip_address(ip_str)
+
+            # Reject private, loopback, link-local, and reserved IPs
+            if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
+                return False
+        except (socket.gaierror, ValueError):
+            # If we can't resolve, be cautious but allow (might be valid external host)
+            pass
+
+        return True
+
     def is_safe_url(url: str) -> bool:
         """URL validation fallback with comprehensive private IP rejection."""
         from urllib.parse import urlparse
-        import ipaddress
-        import socket
         try:
             parsed = urlparse(url)
             host = parsed.hostname
             if not host:
                 return False
 
-            # Block common dangerous hostnames
-            dangerous_hosts = {
-                'localhost', '127.0.0.1', '::1',
-                '169.254.169.254',  # AWS metadata
-                'metadata.google.internal',  # GCP metadata
-                '100.100.100.200',  # Alibaba metadata
-            }
-            if host.lower() in dangerous_hosts:
-                return False
-
-            # Try to resolve and check if it's a private IP
-            try:
-                # Resolve hostname to IP.
-                # NOTE: TOCTOU — DNS may resolve differently between this check
-                # and the actual connection (DNS rebinding). A full fix requires
-                # binding the resolved IP directly; left as a known limitation.
-                ip_str = socket.gethostbyname(host)
-                ip = ipaddress.ip_address(ip_str)
-
-                # Reject private, loopback, link-local, and reserved IPs
-                if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
-                    return False
-            except (socket.gaierror, ValueError):
-                # If we can't resolve, be cautious but allow (might be valid external host)
-                pass
-
             # Only allow http and https schemes
             if parsed.scheme not in ('http', 'https'):
                 return False
 
-            return True
+            return _host_safe(host.lower())
         except Exception:
             return False
 
@@ -77,17 +142,13 @@ class OpenAIProvider(ImageProvider):
 
     def _get_api_key(self) -> Optional[str]:
         """Get OpenAI API key from environment."""
-        return os.environ.get("OPENAI_API_KEY")
+        return env_api_key("openai")
 
     def _get_client(self):
         """Get OpenAI client."""
-        try:
-            from openai import OpenAI
-            return OpenAI(api_key=self._get_api_key())
-        except ImportError:
-            raise ImportError(
-                "openai package not installed. Run: pip install openai"
-            )
+        OpenAI = _openai()
+        api_key = self._get_api_key()
+        return self._cached_client(api_key, lambda: OpenAI(api_key=api_key))
 
     def validate_config(self) -> ProviderResult:
         """Validate OpenAI API configuration."""
@@ -148,31 +209,41 @@ class OpenAIProvider(ImageProvider):
 
             response = client.images.generate(**params)
 
-            # Save images
+            # Save images; every file lands in the same directory
+            parent, stem = output_path.parent, output_path.stem
+            ensure_dir(parent)
             saved_files = []
+            encoded = []
+            downloads = []
             for i, image_data in enumerate(response.data):
                 # Generate filename for multiple images
                 if count > 1:
-                    filepath = output_path.parent / f"{output_path.stem}_{i+1}.png"
+                    filepath = parent / f"{stem}_{i+1}.png"
                 else:
                     filepath = output_path
 
-                filepath.parent.mkdir(parents=True, exist_ok=True)
-
                 # Handle base64 response
-                if hasattr(image_data, "b64_json") and image_data.b64_json:
-                    self._save_base64(image_data.b64_json, filepath)
+                b64_json = getattr(image_data, "b64_json", None)
+                if b64_json:
+                    encoded.append((b64_json, filepath))
                     saved_files.append(str(filepath))
+                    continue
 
                 # Handle URL response (DALL-E)
-                elif hasattr(image_data, "url") and image_data.url:
-                    if not is_safe_url(image_data.url):
+                url = getattr(image_data, "url", None)
+                if url:
+                    if not is_safe_url(url):
                         return self._error(
-                            f"Unsafe URL returned by API: {image_data.url}"
+                            f"Unsafe URL returned by API: {url}"
                         )
-                    self._secure_download(image_data.url, filepath)
+                    downloads.append((url, filepath))
                     saved_files.append(str(filepath))
 
+            if encoded:
+                self._save_base64_all(encoded)
+            if downloads:
+                self._download_all(downloads)
+
             if saved_files:
                 return self._success(saved_files, prompt)
             else:
@@ -231,29 +302,29 @@ class OpenAIProvider(ImageProvider):
                 "size": size
             }
 
-            with open(image_path, "rb") as image_file:
-                edit_params["image"] = image_file
+            with ExitStack() as stack:
+                edit_params["image"] = _upload_file(image_path, stack)
 
                 # Include mask if provided for inpainting
                 if mask_path and mask_path.exists():
-                    with open(mask_path, "rb") as mask_file:
-                        edit_params["mask"] = mask_file
-                        response = client.images.edit(**edit_params)
-                else:
-                    response = client.images.edit(**edit_params)
+                    edit_params["mask"] = _upload_file(mask_path, stack)
+
+                response = client.images.edit(**edit_params)
 
             if response.data:
                 image_data = response.data[0]
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-
-                if hasattr(image_data, "b64_json") and image_data.b64_json:
-                    self._save_base64(image_data.b64_json, output_path)
-                elif hasattr(image_data, "url") and image_data.url:
-                    if not is_safe_url(image_data.url):
+                ensure_dir(output_path.parent)
+
+                b64_json = getattr(image_data, "b64_json", None)
+                url = getattr(image_data, "url", None)
+                if b64_json:
+                    self._save_base64(b64_json, output_path)
+                elif url:
+                    if not is_safe_url(url):
                         return self._error(
-                            f"Unsafe URL returned by API: {image_data.url}"
+                            f"Unsafe URL returned by API: {url}"
                         )
-                    self._secure_download(image_data.url, output_path)
+                    self._download_all([(url, output_path)])
                 else:
                     return self._error("No image data in API response")
 
@@ -312,13 +383,95 @@ class OpenAIProvider(ImageProvider):
             b64_data: Base64 encoded image string.
             filepath: Target path.
         """
-        # Remove data URI prefix if present
-        if "," in b64_data:
-            b64_data = b64_data.split(",", 1)[1]
+        write_image(b64_data, filepath)
+
+    def _save_base64_all(self, encoded: List[Tuple[str, Path]]) -> None:
+        """Decode and write several (b64_data, filepath) pairs, overlapping the writes."""
+        if len(encoded) == 1:
+            self._save_base64(*encoded[0])
+            return
+
+        with ThreadPoolExecutor(max_workers=min(len(encoded), MAX_WRITE_WORKERS)) as executor:
+            list(executor.map(lambda item: self._save_base64(*item), encoded))
+
+    def _download_all(self, downloads: List[Tuple[str, Path]]) -> None:
+        """Download several (url, filepath) pairs concurrently.
+
+        With httpx installed all downloads share one pooled client, so the
+        TCP/TLS handshake is paid once per host rather than once per image.
+
+        Raises:
+            The first download error, as _secure_download would.
+        """
+        if httpx is None:
+            self._run_downloads(downloads, self._secure_download)
+            return
+
+        with self._httpx_client() as client:
+            self._run_downloads(
+                downloads,
+                lambda url, filepath: self._httpx_download(client, url, filepath)
+            )
+
+    @staticmethod
+    def _run_downloads(downloads: List[Tuple[str, Path]], download) -> None:
+        """Call download(url, filepath) for each pair, threaded when there are several."""
+        if len(downloads) == 1:
+            download(*downloads[0])
+            return
+
+        with ThreadPoolExecutor(max_workers=min(len(downloads), MAX_DOWNLOAD_WORKERS)) as executor:
+            list(executor.map(lambda item: download(*item), downloads))
+
+    @staticmethod
+    def _httpx_client(timeout: int = 30):
+        """Create a pooled httpx client, using HTTP/2 when h2 is installed.
+
+        Redirects are not followed automatically; _httpx_download validates
+        each hop before following it.
+        """
+        options = {
+            "timeout": timeout,
+            "follow_redirects": False,
+            "headers": {"User-Agent": USER_AGENT},
+        }
+        try:
+            return httpx.Client(http2=True, **options)
+        except ImportError:
+            # http2=True needs the h2 package (pip install httpx[http2])
+            return httpx.Client(**options)
+
+    def _httpx_download(self, client, url: str, filepath: Path, max_redirects: int = 5) -> None:
+        """Stream a URL to disk through a shared httpx client with redirect validation.
+
+        Args:
+            client: httpx.Client from _httpx_client().
+            url: URL to download from.
+            filepath: Target file path.
+            max_redirects: Maximum number of redirects to follow.
+
+        Raises:
+            ValueError: If a redirect points at an unsafe URL, or there are too many.
+            httpx.HTTPError: On network or HTTP status errors.
+        """
+        ensure_dir(filepath.parent)
+
+        for _ in range(max_redirects + 1):
+            with client.stream("GET", url) as response:
+                if response.is_redirect:
+                    # Validate the redirect URL for SSRF
+                    url = str(response.url.join(response.headers["location"]))
+                    if not is_safe_url(url):
+                        raise ValueError(f"Redirect to unsafe URL blocked: {url}")
+                    continue
+
+                response.raise_for_status()
+                with open(filepath, 'wb') as f:
+                    for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                return
 
-        image_data = base64.b64decode(b64_data)
-        with open(filepath, "wb") as f:
-            f.write(image_data)
+        raise ValueError(f"Too many redirects (max {max_redirects})")
 
     def _secure_download(self, url: str, filepath: Path, timeout: int = 30, max_redirects: int = 5) -> None:
         """Securely download a file from URL with timeout and redirect validation.
@@ -357,16 +510,11 @@ class OpenAIProvider(ImageProvider):
 
         # Create request with timeout
         request = urllib.request.Request(url)
-        request.add_header('User-Agent', 'claude-code-plugins/1.0')
+        request.add_header('User-Agent', USER_AGENT)
 
-        filepath.parent.mkdir(parents=True, exist_ok=True)
+        ensure_dir(filepath.parent)
 
         with opener.open(request, timeout=timeout) as response:
             with open(filepath, 'wb') as f:
-                # Read in chunks to avoid memory issues with large files
-                chunk_size = 8192
-                while True:
-                    chunk = response.read(chunk_size)
-                    if not chunk:
-                        break
-                    f.write(chunk)
+                # Stream in chunks to avoid memory issues with large files
+                shutil.copyfileobj(response, f, DOWNLOAD_CHUNK_SIZE)
@@ -4,13 +4,114 @@ Shared utilities for imagegen plugin.
 """
 
 import base64
+import functools
 import hashlib
+import json
 import os
 import re
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, NoReturn, Optional, Tuple, Union
+
+# orjson is optional; it serializes straight to bytes and parses faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Whether indented output is as cheap as compact output (orjson) or not
+HAS_ORJSON = orjson is not None
+
+# pybase64 is optional; its SIMD decoder is several times faster on the
+# multi-MB payloads image APIs return
+try:
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
+# API key environment variables per provider, in lookup order
+PROVIDER_ENV_VARS = {
+    "google": ("GEMINI_API_KEY", "GOOGLE_API_KEY"),
+    "openai": ("OPENAI_API_KEY",),
+}
+
+def env_api_key(provider: str) -> Optional[str]:
+    """Get the first non-empty API key environment variable for a provider."""
+    for env_var in PROVIDER_ENV_VARS.get(provider, ()):
+        key = os.environ.get(env_var)
+        if key:
+            return key
+    return None
+
+def json_dumps(obj: Any, indent: bool = True) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def json_loads(data: Any) -> Any:
+    """Parse JSON from str or bytes, using orjson when installed.
+
+    Both implementations raise a json.JSONDecodeError subclass on bad input.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def print_json(obj: Any) -> None:
+    """Print obj as indented JSON, writing the encoded bytes straight to stdout."""
+    # Flush pending text output so it stays ahead of the raw bytes
+    sys.stdout.flush()
+    sys.stdout.buffer.write(json_dumps(obj) + b"\n")
+    sys.stdout.buffer.flush()
+
+# Directories already created by ensure_dir in this process
+_CREATED_DIRS = set()
+
+def ensure_dir(path: Path) -> Path:
+    """Create a directory (and parents) once per process; return the path."""
+    key = str(path)
+    if key not in _CREATED_DIRS:
+        path.mkdir(parents=True, exist_ok=True)
+        _CREATED_DIRS.add(key)
+    return path
+
+@functools.lru_cache(maxsize=512)
+def _resolve(path: str) -> Path:
+    """Resolve a path string; cached by resolve_path."""
+    return Path(path).resolve()
+
+def resolve_path(path: Path) -> Path:
+    """Resolve a path to an absolute one, cached for the life of the process.
+
+    For display and bookkeeping only; security checks resolve afresh.
+    Relative paths assume the working directory does not change.
+    """
+    return _resolve(str(path))
+
+# System directories output may not be written into
+DANGEROUS_DIRS = ('/etc', '/usr', '/bin', '/sbin', '/var', '/root')
+_DANGEROUS_PREFIXES = tuple(d + '/' for d in DANGEROUS_DIRS)
+
+def _is_dangerous(path: str) -> bool:
+    """Whether an absolute path is, or is inside, a system directory."""
+    return path in DANGEROUS_DIRS or path.startswith(_DANGEROUS_PREFIXES)
+
+def is_safe_output_path(output_path: Path) -> bool:
+    """Validate output path to prevent directory traversal attacks."""
+    try:
+        # Cheap lexical check first: obvious system paths are rejected
+        # without touching the filesystem
+        if _is_dangerous(os.path.normpath(os.path.abspath(output_path))):
+            return False
+        # Symlinks can still point into a system directory, so anything that
+        # passes is confirmed against the fully resolved path
+        return not _is_dangerous(str(output_path.resolve()))
+    except Exception:
+        return False
 
 def generate_filename(prompt: str, prefix: str = "img", extension: str = "png",
                       include_timestamp: bool = True, include_hash: bool = True) -> str:
@@ -36,35 +137,75 @@ def sanitize_prompt(prompt: str) -> str:
     # Truncate to reasonable length
     return sanitized[:50]
 
-def save_base64_image(b64_data: str, filepath: Path) -> Path:
-    """Save base64-encoded image data to file."""
-    # Remove data URI prefix if present
-    if "," in b64_data:
-        b64_data = b64_data.split(",", 1)[1]
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
+# Base64 characters decoded per step when writing encoded images; a multiple
+# of 4 so each slice decodes independently
+B64_CHUNK_CHARS = 64 * 1024
 
-    image_data = base64.b64decode(b64_data)
-    with open(filepath, "wb") as f:
-        f.write(image_data)
+# Line breaks and other ASCII whitespace in wrapped (MIME/PEM-style) base64
+_B64_WHITESPACE_RE = re.compile(r"[ \t\n\r\f\v]+")
+
+def _write_all(fd: int, data: bytes) -> None:
+    """Write all of data to a raw file descriptor."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def write_image(data: Union[bytes, str], filepath: Path) -> Path:
+    """Write image data to file.
+
+    Raw bytes are written as-is; str data is treated as base64 (optionally
+    a data URI) and decoded in fixed-size slices as it is written, so the
+    full decoded image is never held in memory alongside the encoded one.
+    """
+    # Write straight to the fd, skipping the buffered file object's extra copy
+    fd = os.open(filepath, _WRITE_FLAGS, 0o666)
+    try:
+        if isinstance(data, str):
+            # Skip the data URI prefix if present
+            start = data.find(",") + 1
+            # Wrapped base64 would shift the slices off the 4-character
+            # groups, so strip its whitespace first
+            if _B64_WHITESPACE_RE.search(data, start):
+                data = _B64_WHITESPACE_RE.sub("", data[start:])
+                start = 0
+            for offset in range(start, len(data), B64_CHUNK_CHARS):
+                _write_all(fd, b64decode(data[offset:offset + B64_CHUNK_CHARS]))
+        else:
+            _write_all(fd, data)
+    except BaseException:
+        # Don't leave a truncated image behind on bad base64
+        os.close(fd)
+        filepath.unlink(missing_ok=True)
+        raise
+    os.close(fd)
     return filepath
 
+def save_base64_image(b64_data: str, filepath: Path) -> Path:
+    """Save base64-encoded image data to file."""
+    return write_image(b64_data, filepath)
+
 def load_image_as_base64(filepath: Path) -> str:
     """Load an image file and return as base64 string."""
     with open(filepath, "rb") as f:
         image_data = f.read()
     return base64.b64encode(image_data).decode("utf-8")
 
+# Image MIME types by lowercase file extension
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif"
+}
+
 def get_image_mime_type(filepath: Path) -> str:
     """Get MIME type based on file extension."""
-    ext = filepath.suffix.lower()
-    mime_types = {
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".webp": "image/webp",
-        ".gif": "image/gif"
-    }
-    return mime_types.get(ext, "image/png")
+    return IMAGE_MIME_TYPES.get(filepath.suffix.lower(), "image/png")
 
+@functools.lru_cache(maxsize=32)
 def format_size_for_openai(size: str) -> str:
     """Convert size specification to OpenAI format."""
     size = size.lower().strip()
@@ -83,6 +224,7 @@ def format_size_for_openai(size: str) -> str:
 
     return "1024x1024"  # default
 
+@functools.lru_cache(maxsize=32)
 def format_aspect_ratio_for_google(aspect_ratio: str) -> str:
     """Convert aspect ratio specification to Google format."""
     aspect_ratio = aspect_ratio.lower().strip()
@@ -110,26 +252,31 @@ def print_result(success: bool, message: str, filepath: Optional[Path] = None,
 
     if filepath:
         print(f"File: {filepath}")
-        print(f"Absolute path: {filepath.resolve()}")
+        print(f"Absolute path: {resolve_path(filepath)}")
 
     if metadata:
         print("\nMetadata:")
         for key, value in metadata.items():
             print(f"  {key}: {value}")
 
+def emit_error(message: str, as_json: bool = False) -> NoReturn:
+    """Report a fatal error as JSON or via print_result, then exit with status 1."""
+    if as_json:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(json_dumps({"success": False, "error": message}, indent=False) + b"\n")
+        sys.stdout.buffer.flush()
+    else:
+        print_result(False, message)
+    sys.exit(1)
+
 def validate_api_key(provider: str) -> Tuple[bool, str]:
     """Check if API key is available for the provider."""
-    if provider == "google":
-        key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
-        env_var = "GEMINI_API_KEY or GOOGLE_API_KEY"
-    elif provider == "openai":
-        key = os.environ.get("OPENAI_API_KEY")
-        env_var = "OPENAI_API_KEY"
-    else:
+    env_vars = PROVIDER_ENV_VARS.get(provider)
+    if not env_vars:
         return False, f"Unknown provider: {provider}"
 
-    if not key:
-        return False, f"API key not found. Set {env_var} environment variable."
+    if not env_api_key(provider):
+        return False, f"API key not found. Set {' or '.join(env_vars)} environment variable."
     return True, "API key found"
 
 def parse_provider_model(provider_model: str) -> Tuple[str, Optional[str]]:
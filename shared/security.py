@@ -7,6 +7,7 @@ for safe command execution across different contexts.
 """
 
 import fnmatch
+import functools
 import ipaddress
 import os
 import shlex
@@ -36,8 +37,6 @@ def is_safe_url(url: str, resolve_dns: bool = True) -> bool:
         >>> is_safe_url("http://169.254.169.254/metadata")
         False
     """
-    import socket
-
     try:
         parsed = urlparse(url)
         host = parsed.hostname
@@ -50,45 +49,68 @@ def is_safe_url(url: str, resolve_dns: bool = True) -> bool:
         if scheme not in ('http', 'https'):
             return False
 
-        # Check for localhost variants
-        if host.lower() in ('localhost', '127.0.0.1', '::1', '0.0.0.0'):
-            return False
+        host = host.lower()
+        verdict = _literal_host_verdict(host)
+        if verdict is not None:
+            return verdict
+        # A hostname: resolve it per call to check the actual IP (prevents DNS
+        # rebinding); caching the answer would ignore the record's TTL
+        if resolve_dns:
+            return _resolved_host_safe(host)
+        return True
+    except Exception:
+        return False
 
-        # Check for cloud metadata endpoints
-        metadata_hosts = (
-            '169.254.169.254',
-            'metadata.google.internal',
-            'metadata.google.com',
-            'metadata.aws.amazon.com',
-            'instance-data',
-            '100.100.100.200',  # Alibaba Cloud metadata
-        )
-        if host.lower() in metadata_hosts:
-            return False
 
-        # Try to parse as IP address and check for private ranges
-        try:
-            ip = ipaddress.ip_address(host)
-            if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
-                return False
-        except ValueError:
-            # Not an IP address - it's a hostname
-            # Resolve it to check the actual IP (prevents DNS rebinding)
-            if resolve_dns:
-                try:
-                    resolved_ip = socket.gethostbyname(host)
-                    ip = ipaddress.ip_address(resolved_ip)
-                    if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
-                        return False
-                except (socket.gaierror, ValueError):
-                    # Can't resolve - be cautious but allow (might be valid external host)
-                    # The actual request will fail anyway if it can't resolve
-                    pass
+@functools.lru_cache(maxsize=256)
+def _literal_host_verdict(host: str) -> Optional[bool]:
+    """Check a lowercased hostname or IP literal against SSRF blocklists.
 
-        return True
-    except Exception:
+    Only the DNS-free checks are cached, so a response with many URLs on the
+    same CDN host parses them once. Returns None for a hostname that passes
+    them and still needs resolving.
+    """
+    # Check for localhost variants
+    if host in ('localhost', '127.0.0.1', '::1', '0.0.0.0'):
         return False
 
+    # Check for cloud metadata endpoints
+    metadata_hosts = (
+        '169.254.169.254',
+        'metadata.google.internal',
+        'metadata.google.com',
+        'metadata.aws.amazon.com',
+        'instance-data',
+        '100.100.100.200',  # Alibaba Cloud metadata
+    )
+    if host in metadata_hosts:
+        return False
+
+    # Try to parse as IP address and check for private ranges
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        # Not an IP address - it's a hostname
+        return None
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved)
+
+
+def _resolved_host_safe(host: str) -> bool:
+    """Resolve a hostname and check the IP it currently points at."""
+    import socket
+
+    try:
+        resolved_ip = socket.gethostbyname(host)
+        ip = ipaddress.ip_address(resolved_ip)
+        if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
+            return False
+    except (socket.gaierror, ValueError):
+        # Can't resolve - be cautious but allow (might be valid external host)
+        # The actual request will fail anyway if it can't resolve
+        pass
+
+    return True
+
 
 def safe_path(path: str) -> str:
     """Resolve path with symlink resolution for security.